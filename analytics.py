@@ -0,0 +1,215 @@
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from metrics import span
+
+# 距上次複習的天數分組，用來畫記憶保留曲線
+GAP_LABELS = ['當天', '1天', '2-3天', '4-7天', '8-14天', '15-30天', '31天以上']
+# 用 gap + 1 查表 (gap 最多算到 31)；gap = -1 (第一次看到) 查到最後一格，不算進保留率
+GAP_BUCKET = np.array([7, 0, 1, 2, 2] + [3] * 4 + [4] * 7 + [5] * 16 + [6], dtype=np.int64)
+LEVELS = 4
+
+def _bincount(keys, weights=None, size=0):
+    return np.bincount(keys, weights=weights, minlength=size)[:size]
+
+def _grow(arr, size):
+    # 沿第一個維度補 0 到 size
+    if len(arr) >= size:
+        return arr
+    return np.concatenate([arr, np.zeros((size - len(arr),) + arr.shape[1:], dtype=arr.dtype)])
+
+class _Totals:
+    # 一個範圍 (某個使用者或全班) 的累計量；新的作答紀錄只算尾巴再加上去
+    def __init__(self, groups):
+        self.n = 0
+        self.reviews = 0
+        self.correct = 0
+        self.day0 = None
+        self.days = np.zeros(0, dtype=np.int64)  # 每天作答數
+        self.levels = np.zeros((0, LEVELS + 1), dtype=np.int64)  # 每天各 level 的增減
+        # 多一列 / 一行給不算的紀錄 (不在單字表裡、第一次看到)，顯示時切掉
+        self.retention = {col: (np.zeros((len(names) + 1, len(GAP_LABELS) + 1), dtype=np.int64),
+                                np.zeros((len(names) + 1, len(GAP_LABELS) + 1)))
+                          for col, (_, names) in groups.items()}
+        self.word_reviews = np.zeros(0, dtype=np.int64)
+        self.word_misses = np.zeros(0, dtype=np.int64)
+        self.result = None
+        self.today = None
+
+class Analytics:
+    # 每版單字表建一次: 類別 / 週次代碼。每個範圍的累計量放在行程裡，有新作答只處理新增的紀錄；
+    # 全部用 bincount 累加，不做排序或 groupby
+    def __init__(self, df_vocab, max_scopes=64):
+        self.df_vocab = df_vocab
+        self.word_index = {w: i for i, w in enumerate(df_vocab['word'].tolist())}
+        groups = {}
+        for col in ('week', 'type'):
+            values = df_vocab[col].astype(str).replace('<NA>', '')
+            names = sorted(set(values.tolist()) - {''}, key=lambda v: (0, int(v)) if v.isdigit() else (1, v))
+            codes = np.asarray(pd.Categorical(values, categories=names).codes, dtype=np.int64)  # 空白 -> -1
+            labels = [f"Week {v}" for v in names] if col == 'week' else names
+            groups[col] = (codes, labels)
+        self.groups = groups
+        self._word_pos = np.empty(0, dtype=np.int64)
+        self._word_groups = {col: np.empty(0, dtype=np.int64) for col in groups}
+        self._scopes = OrderedDict()
+        self._max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._following = False
+
+    def _positions(self, words):
+        # 紀錄裡的單字 id -> 目前單字表的列位置 (-1 = 已經不在表裡) 及各分組代碼 (不在表裡 / 沒分組 = 最後一組)；
+        # 字典只會變長，只補新的部分
+        done = len(self._word_pos)
+        if done < len(words):
+            new = np.array([self.word_index.get(w, -1) for w in words[done:len(words)]], dtype=np.int64)
+            self._word_pos = np.concatenate([self._word_pos, new])
+            for col, (codes, names) in self.groups.items():
+                group = np.where(new >= 0, codes[np.maximum(new, 0)], -1)
+                group[group < 0] = len(names)
+                self._word_groups[col] = np.concatenate([self._word_groups[col], group])
+        return self._word_pos
+
+    def follow(self, log):
+        # 全班的累計量跟著紀錄寫入累加 (在 persist 背景執行緒)，學習分析頁只剩畫圖；
+        # 第一次呼叫時補算既有紀錄，之後重複呼叫直接略過
+        with self._lock:
+            if self._following:
+                return
+            self._following = True
+        log.subscribe(self._on_append)
+
+    def _on_append(self, events, words, users):
+        with self._lock:
+            self._update(self._scope(None), None, events, words, users)
+
+    def _scope(self, user_id):
+        totals = self._scopes.get(user_id)
+        if totals is None:
+            totals = self._scopes[user_id] = _Totals(self.groups)
+            if len(self._scopes) > self._max_scopes:
+                # 有在跟著紀錄累加的全班不丟
+                oldest = next(k for k in self._scopes if k is not None or not self._following)
+                del self._scopes[oldest]
+        self._scopes.move_to_end(user_id)
+        return totals
+
+    def _update(self, totals, user_id, events, words, users):
+        n = len(events['day'])
+        if totals.n >= n:
+            return
+        with span('analytics.update'):
+            tail = {name: col[totals.n:n] for name, col in events.items()}
+            if user_id is not None:
+                uid = users.get(str(user_id))
+                rows = np.flatnonzero(tail['user'] == uid) if uid is not None else []
+                tail = {name: col[rows] for name, col in tail.items()}
+            self._add(totals, tail, words)
+        totals.n = n
+        totals.result = None
+
+    def report(self, log, user_id=None, today=None):
+        # user_id=None 代表全班
+        today = (today or datetime.date.today()).toordinal()
+        events, words, users = log.snapshot()
+        with self._lock:
+            totals = self._scope(user_id)
+            self._update(totals, user_id, events, words, users)
+            if totals.result is None or totals.today != today:
+                with span('analytics.report'):
+                    totals.result = self._render(totals, words, today)
+                totals.today = today
+            return totals.result
+
+    def _add(self, t, events, words):
+        day, word, new = events['day'], events['word'], events['new']
+        if not len(day):
+            return
+        self._positions(words)
+        word = word.astype(np.int64)
+        correct = new > 1  # 答錯一律回到 level 1
+
+        if t.day0 is None:
+            t.day0 = int(day.min())
+        rel = day.astype(np.int64) - t.day0
+        if rel.min() < 0:
+            np.maximum(rel, 0, out=rel)
+        nd = int(rel.max()) + 1
+        t.days = _grow(t.days, nd)
+        t.days[:nd] += _bincount(rel, size=nd)
+        # 等級分布: 新 level +1，之前的 level -1；第一次出現的字沒有之前，算到用不到的 level 0 那格。
+        # 按日期累加就是每天的分布
+        size = nd * (LEVELS + 1)
+        rel *= LEVELS + 1
+        old = events['old'] * ~events['first']
+        delta = _bincount(rel + new, size=size) - _bincount(rel + old, size=size)
+        t.levels = _grow(t.levels, nd)
+        t.levels[:nd] += delta.reshape(nd, LEVELS + 1)
+
+        # 記憶保留: 依 (組別, 距上次複習天數) 累計作答數 / 答對數
+        bucket = GAP_BUCKET[np.minimum(events['gap'], len(GAP_BUCKET) - 2) + 1]
+        for col in self.groups:
+            total, hits = t.retention[col]
+            keys = self._word_groups[col][word] * total.shape[1] + bucket
+            total += _bincount(keys, size=total.size).reshape(total.shape)
+            hits += _bincount(keys, correct, total.size).reshape(hits.shape)
+
+        nw = len(words)
+        t.word_reviews = _grow(t.word_reviews, nw)
+        t.word_misses = _grow(t.word_misses, nw)
+        t.word_reviews += _bincount(word, size=nw)
+        t.word_misses += _bincount(word[~correct], size=nw)
+        t.reviews += len(day)
+        t.correct += int(np.count_nonzero(correct))
+
+    def _render(self, t, words, today):
+        result = {'reviews': t.reviews}
+        if not t.reviews:
+            return result
+        result['accuracy'] = t.correct / t.reviews
+        result.update(self._streaks(_grow(t.days, today - t.day0 + 1)[:max(0, today - t.day0 + 1)] > 0))
+        result['retention'] = {col: self._retention(*t.retention[col], self.groups[col][1]) for col in self.groups}
+        result['levels'] = self._level_timeline(t.day0, t.levels)
+        result['missed'] = self._most_missed(t.word_reviews, t.word_misses, words)
+        return result
+
+    def _streaks(self, active):
+        # 連續作答天數: 在頭尾補 False，找每段 True 的起訖
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], active, [False]]).astype(np.int8)))
+        runs = edges[1::2] - edges[::2]
+        current = 0
+        if len(runs) and edges[-1] >= len(active) - 1:  # 最後一段延續到今天 (或昨天)
+            current = int(runs[-1])
+        return {'active_days': int(active.sum()), 'longest_streak': int(runs.max()) if len(runs) else 0,
+                'current_streak': current}
+
+    def _retention(self, total, hits, names):
+        # 各組、各間隔的答對率 (%)
+        total, hits = total[:-1, :-1], hits[:-1, :-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where(total > 0, hits / np.maximum(total, 1) * 100, np.nan)
+        seen = total.sum(axis=1) > 0
+        return pd.DataFrame(rate[seen].T, index=GAP_LABELS, columns=[names[i] for i in np.flatnonzero(seen)])
+
+    def _level_timeline(self, day0, levels):
+        dist = np.cumsum(levels, axis=0)[:, 1:]
+        index = pd.to_datetime([datetime.date.fromordinal(day0 + i) for i in range(len(levels))])
+        return pd.DataFrame(dist, index=index, columns=[f"Lv{i}" for i in range(1, LEVELS + 1)])
+
+    def _most_missed(self, reviews, misses, words, k=10):
+        k = min(k, int(np.count_nonzero(misses)))
+        if k == 0:
+            return pd.DataFrame(columns=['word', 'meaning', 'misses', 'reviews', 'miss_rate'])
+        top = np.argpartition(-misses, k - 1)[:k]
+        top = top[np.lexsort((-reviews[top], -misses[top]))]
+        word_pos = self._word_pos
+        meanings = self.df_vocab['meaning']
+        return pd.DataFrame({
+            'word': [words[i] for i in top],
+            'meaning': [meanings.iat[word_pos[i]] if word_pos[i] >= 0 else '' for i in top],
+            'misses': misses[top],
+            'reviews': reviews[top],
+            'miss_rate': np.round(misses[top] / reviews[top] * 100, 1),
+        })
@@ -1,159 +1,192 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import os
-from gtts import gTTS
 import base64
-from io import BytesIO
 import random
 import time
 import datetime
+import numpy as np
+from vocab import data_source, file_key, load_vocab, load_derived, load_word_index
+from importer import refresh_compiled
+from progress import PROGRESS_BACKEND, SessionProgress, get_progress_store, get_review_log
+from tts import FEEDBACK_LINES, audio_key, get_audio_cache
+from jobs import get_job_queue
+from metrics import ENABLED as PROFILE_ENABLED, begin_rerun, end_rerun, snapshot as profile_snapshot, span, timed
+from quiz import DistractorIndex
+from prefetch import QuestionBuffer, question_maker
+from scheduler import DueQueue, days_since
+from views import FilterView, ProgressStats
+from search import SearchIndex
+from rounds import ROUND_SIZE, build_round, grade_round, next_levels, round_player
+from analytics import Analytics
+from ui import FLASHCARD_BACK, FLASHCARD_FRONT, QUIZ_CARD, RPG_CARD, RPG_STATUS, STYLE, TABS
+
+_ctx = get_script_run_ctx()
+SESSION_ID = _ctx.session_id if _ctx else None
+begin_rerun(SESSION_ID)
 
 # --- 1. 頁面設定 ---
 st.set_page_config(page_title="TOEIC Game Master", page_icon="🎮", layout="wide")
 
-# --- 2. CSS 美化 (視覺修復版) ---
-st.markdown("""
-    <style>
-    /* 全站背景 */
-    .stApp { background-color: #f4f6f9; }
-    
-    /* --- 1. 側邊欄 (維持原樣) --- */
-    [data-testid="stSidebar"] { background-color: #2c3e50; }
-    [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3 { color: #f1c40f !important; }
-    [data-testid="stSidebar"] p, [data-testid="stSidebar"] span, [data-testid="stSidebar"] label, [data-testid="stSidebar"] div { color: #ecf0f1 !important; font-size: 16px; }
-
-    /* --- 2. 主畫面標題修復 (解決看不清楚的問題) --- */
-    /* 強制將主畫面的標題設為深藍色，對比度最高 */
-    .main h1, .main h2, .main h3, .main h4 {
-        color: #2c3e50 !important;
-        font-weight: 800 !important;
-    }
-    
-    /* --- 3. caption 小字修復 (解決進度文字看不清楚) --- */
-    /* 針對 st.caption 產生的文字 */
-    .stCaption, [data-testid="stCaptionContainer"] {
-        color: #5d6d7e !important; /* 深灰色 */
-        font-size: 16px !important;
-        font-weight: bold !important;
-    }
-
-    /* --- 4. Tab 標籤頁優化 --- */
-    .stTabs [data-baseweb="tab-list"] { gap: 8px; background-color: transparent; padding-bottom: 10px; }
-    .stTabs [data-baseweb="tab"] { height: 55px; background-color: #e0e0e0; border-radius: 8px; border: 1px solid #ccc; color: #333333 !important; font-weight: 700; font-size: 18px; padding: 0 25px; }
-    .stTabs [aria-selected="true"] { background-color: #f1c40f !important; color: #ffffff !important; border: none; transform: translateY(-2px); box-shadow: 0 4px 10px rgba(241, 196, 15, 0.4); }
-
-    /* --- 5. 卡片設計 --- */
-    .flashcard-container { background: white; border-radius: 20px; padding: 40px 30px; text-align: center; box-shadow: 0 10px 30px rgba(0,0,0,0.08); margin-bottom: 25px; border-left: 12px solid #f1c40f; min-height: 350px; display: flex; flex-direction: column; justify-content: center; align-items: center; }
-    .flashcard-back { background: #fdfefe; border-left: 12px solid #2ecc71; }
-    
-    .battle-card { background-color: #ffffff; padding: 30px; border-radius: 15px; border: 2px solid #3498db; border-left: 15px solid #2980b9; box-shadow: 0 5px 15px rgba(0,0,0,0.1); text-align: center; margin-bottom: 20px; color: #2c3e50; }
-    .battle-word { font-size: 56px; font-weight: 900; color: #2c3e50; margin: 15px 0; }
-    .battle-label { font-size: 18px; color: #7f8c8d; font-weight: bold; text-transform: uppercase; }
-
-    .word-title { font-size: 64px; font-weight: 900; color: #2c3e50; margin-bottom: 5px; }
-    .phonetic-text { font-family: 'Lucida Sans Unicode', sans-serif; font-size: 24px; color: #95a5a6; margin-bottom: 20px; font-style: italic; }
-    .meaning-text { font-size: 40px; color: #c0392b; font-weight: bold; margin: 20px 0; }
-    .example-box { background-color: #ecf0f1; padding: 20px; border-radius: 12px; margin-top: 20px; text-align: left; width: 100%; border-left: 5px solid #3498db; }
-    .sent-en { font-size: 20px; color: #2c3e50; margin-bottom: 10px; font-weight: 500; line-height: 1.4; }
-    .sent-cn { font-size: 18px; color: #16a085; font-weight: bold; }
-    .tag-badge { background-color: #e1f5fe; color: #0288d1; padding: 5px 15px; border-radius: 15px; font-size: 14px; font-weight: bold; margin-bottom: 15px; display: inline-block; }
-    
-    /* --- 6. RPG 遊戲區例外處理 --- */
-    /* 因為 RPG 背景是深色，所以這裡要強制把文字改回亮色，不然會被上面的規則變成深色而看不見 */
-    .rpg-container { background-color: #2c3e50; padding: 20px; border-radius: 15px; color: white !important; text-align: center; margin-bottom: 20px; border: 3px solid #f1c40f; }
-    
-    .rpg-container h3, .rpg-container h4, .rpg-container p {
-        color: #ffffff !important; /* 強制白色 */
-    }
-    /* 特別指定魔王名稱為金色 */
-    .rpg-container h3 {
-        color: #f1c40f !important; 
-    }
-
-    .monster-img { font-size: 100px; margin-bottom: 10px; animation: bounce 2s infinite; }
-    .health-bar-container { width: 100%; background-color: #555; border-radius: 10px; margin: 10px 0; height: 25px; }
-    .health-bar-fill { height: 100%; border-radius: 10px; transition: width 0.5s ease-in-out; }
-    
-    @keyframes bounce { 0%, 100% { transform: translateY(0); } 50% { transform: translateY(-10px); } }
-    audio { display: none; }
-    </style>
-    """, unsafe_allow_html=True)
+# --- 2. CSS 美化 (視覺修復版)：樣式在 ui.py 壓縮好，每次 rerun 直接送出 ---
+st.markdown(STYLE, unsafe_allow_html=True)
 
 # --- 3. 核心功能 ---
 
+# 開啟 server.enableStaticServing 時，音檔寫進 static/audio 用網址播放 (瀏覽器可快取)；否則內嵌 base64
+AUDIO_BY_URL = st.get_option("server.enableStaticServing")
+def vocab_source():
+    # 有匯入過就用 toeic_vocab.parquet；匯入的來源 (例如 toeic_db.xlsx) 之後又改過，先重新匯入再開
+    try:
+        refresh_compiled()
+    except Exception as e:
+        st.warning(f"⚠️ 單字來源有更新，但重新匯入失敗 (先用上次匯入的單字檔): {e}")
+    return data_source()
+
+VOCAB_FILE = vocab_source()
+
+@timed('audio.autoplay')
 def autoplay_audio(text):
     try:
         clean_text = str(text).strip()
         if not clean_text or clean_text == 'nan': return
-        tts = gTTS(text=clean_text, lang='en')
-        audio_bytes = BytesIO()
-        tts.write_to_fp(audio_bytes)
-        audio_base64 = base64.b64encode(audio_bytes.getvalue()).decode()
+        audio_cache = get_audio_cache()
+        if AUDIO_BY_URL:
+            audio_src = audio_cache.url_for(audio_cache.ensure(clean_text))
+        else:
+            audio_base64 = base64.b64encode(audio_cache.get(clean_text)).decode()
+            audio_src = f"data:{audio_cache.mime_for(audio_key(clean_text))};base64,{audio_base64}"
         rnd_id = int(time.time() * 1000)
-        audio_html = f'<audio src="data:audio/mp3;base64,{audio_base64}" autoplay id="audio_{rnd_id}"></audio>'
+        audio_html = f'<audio src="{audio_src}" autoplay id="audio_{rnd_id}"></audio>'
         st.empty().markdown(audio_html, unsafe_allow_html=True)
-    except: pass
-
-DATA_FILE = "toeic_db.xlsx"
-PROGRESS_FILE = "user_progress.csv"
+    except Exception:
+        # 合成失敗已經記在 audio cache 的統計裡 (側邊欄 ⚙️ 背景工作)，這裡只提示使用者
+        st.toast("🔇 語音暫時無法播放", icon="⚠️")
+
+def queue_feedback_audio(text):
+    # 回饋語音在背景合成；畫面跑到最後若已經準備好才播，不讓作答等網路
+    audio_cache = get_audio_cache()
+    job = audio_cache.ensure if AUDIO_BY_URL else audio_cache.get
+    get_job_queue('audio').submit(job, text)
+    st.session_state.pending_audio = (text, time.time())
+
+def warm_question_audio(item):
+    # 預抽題目時在背景先合成單字發音，出題時 autoplay_audio 直接命中快取
+    text = item['word'].strip()
+    if text and text != 'nan':
+        audio_cache = get_audio_cache()
+        (audio_cache.ensure if AUDIO_BY_URL else audio_cache.get)(text)
+
+def play_pending_audio(max_age=5.0):
+    pending = st.session_state.pending_audio
+    if pending is None:
+        return
+    text, queued_at = pending
+    if get_audio_cache().contains(text):
+        st.session_state.pending_audio = None
+        autoplay_audio(text)
+    elif time.time() - queued_at > max_age:
+        st.session_state.pending_audio = None
 
 def load_data():
-    if os.path.exists(DATA_FILE):
+    if os.path.exists(VOCAB_FILE):
         try:
-            df_vocab = pd.read_excel(DATA_FILE)
-            df_vocab.columns = [c.strip().lower() for c in df_vocab.columns]
-            
-            expected_cols = ['word', 'meaning', 'phonetic', 'sentence', 'sentence_cn', 'type', 'week']
-            for col in expected_cols:
-                if col not in df_vocab.columns:
-                    df_vocab[col] = ''
-            
-            for col in df_vocab.columns:
-                df_vocab[col] = df_vocab[col].astype(str).replace('nan', '')
-                
-            df_vocab.drop_duplicates(subset=['word'], inplace=True)
-            
+            df_vocab = load_vocab(VOCAB_FILE)
+            word_index = load_word_index(VOCAB_FILE)
         except Exception as e:
             st.error(f"讀取資料庫失敗: {e}")
-            return pd.DataFrame()
-    else:
-        st.warning("⚠️ 找不到 toeic_db.xlsx")
-        return pd.DataFrame()
-
-    if os.path.exists(PROGRESS_FILE):
-        df_prog = pd.read_csv(PROGRESS_FILE)
-        df_prog.drop_duplicates(subset=['word'], keep='last', inplace=True)
-        if 'last_review_date' not in df_prog.columns:
-            df_prog['last_review_date'] = ''
-        df_vocab = pd.merge(df_vocab, df_prog, on='word', how='left')
-        df_vocab['level'] = df_vocab['level'].fillna(1).astype(int)
-        df_vocab['last_review_date'] = df_vocab['last_review_date'].fillna('')
+            return pd.DataFrame(), None, {}
     else:
-        df_vocab['level'] = 1
-        df_vocab['last_review_date'] = ''
-        
-    return df_vocab
-
-def save_progress(df):
-    if 'last_review_date' not in df.columns: df['last_review_date'] = ''
-    prog_data = df[['word', 'level', 'last_review_date']].drop_duplicates(subset=['word'], keep='last')
-    prog_data.to_csv(PROGRESS_FILE, index=False)
-
-def update_learning_status(df, word, new_level=None):
-    idx_list = df[df['word'] == word].index
-    if len(idx_list) > 0:
-        idx = idx_list[0]
-        if new_level is not None:
-            df.loc[idx, 'level'] = new_level
-        df.loc[idx, 'last_review_date'] = str(datetime.date.today())
-        save_progress(df)
-    return df
+        st.warning("⚠️ 找不到 toeic_db.xlsx (或 importer.py 匯入的 toeic_vocab.parquet)")
+        return pd.DataFrame(), None, {}
+
+    # 單字表全行程共用 (唯讀)；session 裡只放自己的進度，開 session (或 Excel 更新) 時讀一次
+    vocab_key = (file_key(VOCAB_FILE), st.session_state.user_id)
+    if st.session_state.get('progress_key') != vocab_key:
+        df_prog = get_progress_store(st.session_state.user_id).load()
+        st.session_state.progress = SessionProgress.from_frame(df_prog, word_index)
+        st.session_state.progress_key = vocab_key
+        st.session_state.stats = None
+        # 題目只存列位置，換了單字檔位置就對不上: 出到一半的題目、選項、回合和預抽的題目都作廢
+        for key in ('quiz_q', 'spell_q', 'rpg_q', 'round'):
+            st.session_state[key] = None
+        st.session_state.quiz_opts = []
+        st.session_state.rpg_opts = []
+        st.session_state.prefetch = {}
+    return df_vocab, st.session_state.progress, word_index
+
+def _record_reviews(vocab_file, user_id, rows):
+    # 在 persist 背景執行緒跑: 多人模式下全班統計跟著這裡的寫入累加，學習分析頁開啟時只剩畫圖
+    log = get_review_log()
+    if PROGRESS_BACKEND == "sqlite":
+        load_derived('analytics', Analytics, vocab_file).follow(log)
+    log.record(user_id, rows)
+
+def log_reviews(rows):
+    # 作答事件另外記一份只 append 的紀錄給學習分析用 (進度檔只留最後狀態)
+    get_job_queue('persist').submit(_record_reviews, VOCAB_FILE, st.session_state.user_id or "default", rows)
+
+def update_learning_status(progress, word, new_level=None):
+    pos = word_index.get(word)
+    if pos is not None:
+        old_level, old_date = progress.level(pos), progress.date(pos)
+        level = old_level if new_level is None else new_level
+        today_str = str(datetime.date.today())
+        progress.update(pos, level, today_str)
+        if st.session_state.get('stats') is not None:
+            st.session_state.stats.apply(old_level, level, old_date, today_str)
+        get_job_queue('persist').submit(get_progress_store(st.session_state.user_id).record,
+                                        word, level, today_str)
+        today = datetime.date.today()
+        log_reviews([(word, old_level, level, days_since(old_date, today), today.toordinal())])
+        if st.session_state.get('fc_queue') is not None:
+            st.session_state.fc_queue.schedule(pos, level, today_str)
+    return progress
+
+def apply_round_results(progress, rnd, answers):
+    # 一整回合只在送出時 rerun 一次: level 用向量算、進度一次寫回、背景存檔只排一個工作
+    positions, correct, unanswered = grade_round(rnd, answers)
+    today_str = str(datetime.date.today())
+    if len(positions):
+        pos_list = positions.tolist()
+        old_levels, old_dates = progress.levels_for(pos_list), progress.dates_for(pos_list)
+        new_levels = next_levels(old_levels, correct).tolist()
+        progress.update_many(pos_list, new_levels, today_str)
+        if st.session_state.get('stats') is not None:
+            st.session_state.stats.apply_many(old_levels, new_levels, old_dates, today_str)
+        words = df['word'].take(positions).tolist()
+        get_job_queue('persist').submit(get_progress_store(st.session_state.user_id).record_many,
+                                        list(zip(words, new_levels, [today_str] * len(words))))
+        today = datetime.date.today()
+        log_reviews([(w, old, new, days_since(d, today), today.toordinal())
+                     for w, old, new, d in zip(words, old_levels, new_levels, old_dates)])
+        if st.session_state.get('fc_queue') is not None:
+            for pos, level in zip(pos_list, new_levels):
+                st.session_state.fc_queue.schedule(pos, level, today_str)
+    if rnd['kind'] == 'flashcard' and st.session_state.get('fc_queue') is not None:
+        # 沒答到的閃卡放回今天的隊伍
+        for pos in unanswered:
+            st.session_state.fc_queue.requeue(pos)
+    n_correct = int(np.count_nonzero(correct))
+    st.session_state.xp += n_correct * (10 if rnd['kind'] == 'flashcard' else 20)
+    return n_correct, len(positions)
+
+def get_level(progress, word):
+    return progress.level(word_index[word])
 
 # 初始化 Session State
 default_values = {
     'xp': 0,
     'fc_index': 0,
     'fc_flip': False,
+    'fc_queue': None,
+    'fc_queue_key': None,
+    'fc_pos': None,
+    'progress': None,
+    'stats': None,
+    'user_id': None,
+    'pending_audio': None,
     'monster_hp': 100,
     'player_hp': 100,
     'game_status': "playing",
@@ -161,13 +194,30 @@ default_values = {
     'quiz_opts': [],
     'spell_q': None,
     'rpg_q': None,
-    'rpg_opts': []
+    'rpg_opts': [],
+    'prefetch': {},
+    'round': None,
+    'round_seq': 0,
+    'round_applied': None,
+    'round_summary': None,
 }
 for key, val in default_values.items():
     if key not in st.session_state:
         st.session_state[key] = val
 
-df = load_data()
+# 背景工作不綁 session (見 jobs.py): 關掉瀏覽器也會做完，只有行程結束時才等佇列清空
+_audio_jobs = get_job_queue('audio')
+
+# 多人模式 (TOEIC_PROGRESS_BACKEND=sqlite): 每個學生用自己的 ID 存進度
+if PROGRESS_BACKEND == "sqlite":
+    with st.sidebar:
+        st.session_state.user_id = st.text_input("👤 學號 / 暱稱", key="user_id_input").strip()
+    if not st.session_state.user_id:
+        st.info("👈 請先在左側輸入學號或暱稱")
+        st.stop()
+
+with span('load_data'):
+    df, progress, word_index = load_data()
 
 # --- 4. 側邊欄 ---
 with st.sidebar:
@@ -175,10 +225,13 @@ with st.sidebar:
     st.markdown("---")
     
     if not df.empty:
-        total = len(df)
-        mastered = len(df[df['level'] >= 4])
+        view = load_derived('views', FilterView, VOCAB_FILE)
         today_str = str(datetime.date.today())
-        today_count = len(df[df['last_review_date'] == today_str])
+        if st.session_state.stats is None or st.session_state.stats.today_str != today_str:
+            st.session_state.stats = ProgressStats(progress, today_str)
+        total = len(df)
+        mastered = st.session_state.stats.mastered
+        today_count = st.session_state.stats.today
         
         st.markdown(f"### 📅 今日戰績: **{today_count}** 字")
         st.markdown("### 📊 金色證書進度")
@@ -187,73 +240,97 @@ with st.sidebar:
         st.markdown(f"**XP:** {st.session_state.xp}")
         st.markdown("---")
         
-        cats = ["全部 (All)"] + sorted([x for x in df['type'].unique() if x])
+        cats = ["全部 (All)"] + view.types
         selected_cat = st.selectbox("📂 選擇分類", cats)
         
-        try:
-            valid_weeks = []
-            for w in df['week'].unique():
-                try: valid_weeks.append(int(float(w)))
-                except: pass
-            weeks = ["全部 (All)"] + sorted(list(set(valid_weeks)))
-        except:
-            weeks = ["全部 (All)"]
-            
+        weeks = ["全部 (All)"] + view.weeks
         selected_week = st.selectbox("📅 選擇週次", weeks)
+        hard_mode = st.toggle("😈 困難模式 (同分類選項)")
+
+        with st.expander("⚙️ 背景工作"):
+            for name in ('persist', 'audio', 'prefetch'):
+                m = get_job_queue(name).metrics()
+                st.caption(f"{name}: 佇列 {m['depth']} | 完成 {m['done']} | 失敗 {m['failed']} | 平均 {m['avg_ms']} ms | 最長 {m['max_ms']} ms")
+            audio_cache = get_audio_cache()
+            a = audio_cache.metrics()
+            # 包的格式跟引擎不同時標出來 (包裡的音檔照包的格式送出)
+            pack_fmt = f" {a['pack_ext']}" if a['pack_ext'] and a['pack_ext'] != audio_cache.ext else ""
+            st.caption(f"tts: 語音包 {a['pack']} 筆{pack_fmt} (命中 {a['pack_hits']}) | 合成 {a['synth']} | 合成失敗 {a['failed']}")
+            if a['last_error']:
+                st.caption(f"最後一次合成錯誤: {a['last_error']}")
 
 # --- 5. 篩選邏輯 ---
 if df.empty: st.stop()
 
-df['week'] = pd.to_numeric(df['week'], errors='coerce')
-learning_pool = df.copy()
-
-if selected_cat != "全部 (All)":
-    learning_pool = learning_pool[learning_pool['type'] == selected_cat]
-
-if selected_week != "全部 (All)":
-    learning_pool = learning_pool[learning_pool['week'] == selected_week]
+# 只拿列位置，不複製 df
+with span('filter'):
+    pool_pos = view.positions(None if selected_cat == "全部 (All)" else selected_cat,
+                              None if selected_week == "全部 (All)" else selected_week)
 
-if learning_pool.empty:
+if len(pool_pos) == 0:
     st.warning("⚠️ 此分類與週次的組合下沒有單字，請嘗試調整篩選條件。")
-    learning_pool = df.head(1)
+    pool_pos = view.positions()[:1]
+
+def get_distractors():
+    # 只有擂台 / RPG / 快速回合用得到，第一次進這些分頁才建
+    return load_derived('distractors', DistractorIndex, VOCAB_FILE)
+
+def flashcard_queue():
+    # 依 level / 上次複習日排出到期順序；換範圍、換學號 (或 Excel 更新) 才重建。閃卡和快速回合共用
+    fc_key = (selected_cat, selected_week, file_key(VOCAB_FILE), st.session_state.user_id)
+    if st.session_state.fc_queue_key != fc_key:
+        pool_list = pool_pos.tolist()
+        st.session_state.fc_queue = DueQueue(pool_pos, progress.levels_for(pool_list), progress.dates_for(pool_list))
+        st.session_state.fc_queue_key = fc_key
+        st.session_state.fc_pos = None
+        st.session_state.fc_index = 0
+    return st.session_state.fc_queue
+
+def question_buffer(mode, with_options=True):
+    # 每種題型的預抽佇列；分類 / 週次 / 困難模式 (或單字檔) 變了就作廢重抽。
+    # session 裡只存題目的列位置，畫面要用時再從共用單字表取
+    buffers = st.session_state.prefetch
+    if mode not in buffers:
+        buffers[mode] = QuestionBuffer()
+    buf = buffers[mode]
+    key = (selected_cat, selected_week, hard_mode if with_options else None, file_key(VOCAB_FILE))
+    buf.configure(key, question_maker(df, pool_pos, get_distractors() if with_options else None, hard_mode), warm_question_audio)
+    buf.refill(get_job_queue('prefetch'))
+    # 回饋語音第一次進作答分頁才開始合成，啟動時不用載入 gTTS
+    get_audio_cache().prewarm_once('feedback', FEEDBACK_LINES, _audio_jobs)
+    return buf
+
+def next_question(buf):
+    return buf.take(get_job_queue('prefetch'))
 
 # --- 6. 主畫面 ---
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔥 閃卡特訓", "⚔️ 挑戰擂台", "🎧 聽音拼字", "👹 勇者鬥惡龍", "📊 單字總表"])
+# st.tabs 每次 rerun 都要把七頁全部跑完 (連看不到的頁也抽題、建索引)；改成選單，只跑選到的那一頁
+TAB_FLASH, TAB_QUIZ, TAB_SPELL, TAB_RPG, TAB_TABLE, TAB_ROUND, TAB_STATS = TABS
+active_tab = st.radio("分頁", TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
 
 # === TAB 1: 閃卡 ===
-with tab1:
-    if st.session_state.fc_index >= len(learning_pool):
-        st.session_state.fc_index = 0
-        
+if active_tab == TAB_FLASH:
+    fc_queue = flashcard_queue()
+    if st.session_state.fc_pos is None:
+        st.session_state.fc_pos = fc_queue.pop()
+        if st.session_state.fc_pos is None:
+            st.session_state.fc_pos = int(pool_pos[0])
+
     idx = st.session_state.fc_index
-    row = learning_pool.iloc[idx]
+    row = df.iloc[st.session_state.fc_pos]
     
     # 這裡的文字顏色會被 CSS 強制修正為深灰色
-    st.caption(f"📚 範圍單字數: {len(learning_pool)} | 進度: {idx + 1}")
-
-    if not st.session_state.fc_flip:
-        st.markdown(f"""
-        <div class="flashcard-container">
-            <div class="tag-badge">{row.get('type', 'General')}</div>
-            <div class="word-title">{row['word']}</div>
-            <div class="phonetic-text">{row.get('phonetic', '')}</div>
-            <div style="color:#bdc3c7; margin-top:20px;">(點擊翻卡查看詳解)</div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        cn_sentence = row.get('sentence_cn', '') or "(尚無中文翻譯)"
-        st.markdown(f"""
-        <div class="flashcard-container flashcard-back">
-            <div class="word-title" style="font-size: 40px; color:#7f8c8d;">{row['word']}</div>
-            <div class="phonetic-text">{row.get('phonetic', '')}</div>
-            <hr style="width: 50%; border:1px solid #eee;">
-            <div class="meaning-text">{row['meaning']}</div>
-            <div class="example-box">
-                <div class="sent-en">🇬🇧 {row.get('sentence', 'No example.')}</div>
-                <div class="sent-cn">🇹🇼 {cn_sentence}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    st.caption(f"📚 範圍單字數: {len(pool_pos)} | 進度: {idx + 1}")
+
+    with span('render.flashcard'):
+        if not st.session_state.fc_flip:
+            st.markdown(FLASHCARD_FRONT.format(type=row.get('type', 'General'), word=row['word'],
+                                               phonetic=row.get('phonetic', '')), unsafe_allow_html=True)
+        else:
+            cn_sentence = row.get('sentence_cn', '') or "(尚無中文翻譯)"
+            st.markdown(FLASHCARD_BACK.format(word=row['word'], phonetic=row.get('phonetic', ''), meaning=row['meaning'],
+                                              sentence=row.get('sentence', 'No example.'), sentence_cn=cn_sentence),
+                        unsafe_allow_html=True)
 
     c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
     with c1:
@@ -269,8 +346,11 @@ with tab1:
         st.button("🔄 翻轉", use_container_width=True, on_click=toggle_flip)
     with c4:
         def next_card():
+            # 已作答的卡片在 update_learning_status 裡排好了，requeue 只處理跳過的
             st.session_state.fc_flip = False
-            st.session_state.fc_index = (st.session_state.fc_index + 1) % len(learning_pool)
+            st.session_state.fc_queue.requeue(st.session_state.fc_pos)
+            st.session_state.fc_pos = None
+            st.session_state.fc_index += 1
         
         if st.session_state.fc_flip:
                 st.button("➡️ 跳過", use_container_width=True, on_click=next_card)
@@ -282,39 +362,32 @@ with tab1:
         b1, b2 = st.columns(2)
         with b1:
             if st.button("❌ 陌生", use_container_width=True):
-                df = update_learning_status(df, row['word'], new_level=1)
+                update_learning_status(progress, row['word'], new_level=1)
                 next_card()
                 st.rerun()
         with b2:
             if st.button("✅ 記得", type="primary", use_container_width=True):
-                current_lvl = df.loc[df['word'] == row['word'], 'level'].values[0]
-                df = update_learning_status(df, row['word'], new_level=min(4, current_lvl + 1))
+                current_lvl = get_level(progress, row['word'])
+                update_learning_status(progress, row['word'], new_level=min(4, current_lvl + 1))
                 st.session_state.xp += 10
                 next_card()
                 st.rerun()
 
 # === TAB 2: 測驗 (擂台) ===
-with tab2:
-    if len(learning_pool) < 4:
+elif active_tab == TAB_QUIZ:
+    if len(pool_pos) < 4:
         st.warning("單字量不足 (至少需要4個)。")
     else:
+        quiz_buf = question_buffer('quiz')
         if st.session_state.quiz_q is None:
-            q_row = learning_pool.sample(1).iloc[0]
-            st.session_state.quiz_q = q_row
-            correct = q_row['meaning']
-            others = df[df['meaning'] != correct].sample(3)['meaning'].tolist()
-            opts = others + [correct]
-            random.shuffle(opts)
-            st.session_state.quiz_opts = opts
-
-        q = st.session_state.quiz_q
+            item = next_question(quiz_buf)
+            st.session_state.quiz_q = item['pos']
+            st.session_state.quiz_opts = item['options']
+
+        q = df.iloc[st.session_state.quiz_q]
         
-        st.markdown(f"""
-        <div class="battle-card">
-            <div class="battle-label">Question</div>
-            <div class="battle-word">{q['word']}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        with span('render.quiz_card'):
+            st.markdown(QUIZ_CARD.format(word=q['word']), unsafe_allow_html=True)
         
         col_audio_q, col_space_q = st.columns([1, 4])
         with col_audio_q:
@@ -327,12 +400,12 @@ with tab2:
                 if o == q['meaning']:
                     st.toast("✅ 正確！", icon="🎉")
                     st.session_state.xp += 20
-                    autoplay_audio("That is correct! Great job!")
-                    df_upd = update_learning_status(df, q['word'], new_level=min(4, df.loc[df['word'] == q['word'], 'level'].values[0] + 1))
+                    queue_feedback_audio("That is correct! Great job!")
+                    update_learning_status(progress, q['word'], new_level=min(4, get_level(progress, q['word']) + 1))
                 else:
                     st.toast("❌ 錯誤", icon="⚠️")
-                    autoplay_audio("Sorry, that is incorrect.")
-                    df_upd = update_learning_status(df, q['word'], new_level=1)
+                    queue_feedback_audio("Sorry, that is incorrect.")
+                    update_learning_status(progress, q['word'], new_level=1)
                 st.session_state.quiz_q = None
                 
             if cols[i % 2].button(opt, key=f"q_{i}", use_container_width=True):
@@ -340,13 +413,14 @@ with tab2:
                 st.rerun()
 
 # === TAB 3: 聽音拼字 ===
-with tab3:
+elif active_tab == TAB_SPELL:
     st.header("🎧 聽音拼字挑戰")
     
+    spell_buf = question_buffer('spell', with_options=False)
     if st.session_state.spell_q is None:
-        st.session_state.spell_q = learning_pool.sample(1).iloc[0]
+        st.session_state.spell_q = next_question(spell_buf)['pos']
 
-    sq = st.session_state.spell_q
+    sq = df.iloc[st.session_state.spell_q]
     
     col_s1, col_s2 = st.columns([1, 2])
     
@@ -361,23 +435,22 @@ with tab3:
     
     if st.button("送出檢查"):
         if user_spell.strip().lower() == sq['word'].strip().lower():
-            st.success("✅ 拼對了！")
-            autoplay_audio("That is correct!")
+            st.toast("✅ 拼對了！", icon="🎉")
+            queue_feedback_audio("That is correct!")
             st.session_state.xp += 30
-            update_learning_status(df, sq['word'], new_level=4)
-            time.sleep(1)
+            update_learning_status(progress, sq['word'], new_level=4)
             st.session_state.spell_q = None
             st.rerun()
         else:
             st.error(f"❌ 錯誤！正確是: {sq['word']}")
-            autoplay_audio("Sorry, incorrect.")
-            update_learning_status(df, sq['word'], new_level=1)
+            queue_feedback_audio("Sorry, incorrect.")
+            update_learning_status(progress, sq['word'], new_level=1)
             if st.button("再試一題"):
                 st.session_state.spell_q = None
                 st.rerun()
 
 # === TAB 4: 勇者鬥惡龍 (RPG) ===
-with tab4:
+elif active_tab == TAB_RPG:
     st.header("👹 勇者鬥惡龍")
     
     if st.button("🔄 重置遊戲"):
@@ -390,27 +463,8 @@ with tab4:
     m_hp = st.session_state.monster_hp
     p_hp = st.session_state.player_hp
     
-    st.markdown(f"""
-    <div class="rpg-container">
-        <div class="monster-img">{'👿' if m_hp > 0 else '💀'}</div>
-        <h3>多益大魔王 (TOEIC Boss)</h3>
-        <div class="health-bar-container">
-            <div class="health-bar-fill" style="width: {m_hp}%; background-color: #e74c3c;"></div>
-        </div>
-        <p>HP: {m_hp}/100</p>
-    </div>
-    
-    <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:20px;">
-        <div style="width:45%; text-align:center; padding:10px; background: #34495e; border-radius:10px; color:white;">
-            <h4>🛡️ 勇者 (You)</h4>
-            <div class="health-bar-container">
-                <div class="health-bar-fill" style="width: {p_hp}%; background-color: #2ecc71;"></div>
-            </div>
-            <p>HP: {p_hp}/100</p>
-        </div>
-        <div style="font-size:30px;">VS</div>
-    </div>
-    """, unsafe_allow_html=True)
+    with span('render.rpg_status'):
+        st.markdown(RPG_STATUS.format(monster='👿' if m_hp > 0 else '💀', m_hp=m_hp, p_hp=p_hp), unsafe_allow_html=True)
 
     if st.session_state.game_status == "win":
         st.balloons()
@@ -427,22 +481,16 @@ with tab4:
             st.session_state.game_status = "playing"
             st.rerun()
     else:
+        rpg_buf = question_buffer('rpg')
         if st.session_state.rpg_q is None:
-            st.session_state.rpg_q = learning_pool.sample(1).iloc[0]
-            correct_r = st.session_state.rpg_q['meaning']
-            dists_r = df[df['meaning'] != correct_r].sample(3)['meaning'].tolist()
-            opts_r = dists_r + [correct_r]
-            random.shuffle(opts_r)
-            st.session_state.rpg_opts = opts_r
-
-        rq = st.session_state.rpg_q
+            item = next_question(rpg_buf)
+            st.session_state.rpg_q = item['pos']
+            st.session_state.rpg_opts = item['options']
+
+        rq = df.iloc[st.session_state.rpg_q]
         
-        st.markdown(f"""
-        <div class="battle-card" style="border-color: #e74c3c;">
-            <div class="battle-label" style="color:#e74c3c;">⚔️ 攻擊指令 (Attack Command)</div>
-            <div class="battle-word">{rq['word']}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        with span('render.rpg_card'):
+            st.markdown(RPG_CARD.format(word=rq['word']), unsafe_allow_html=True)
         
         col_audio, col_space = st.columns([1, 4])
         with col_audio:
@@ -455,15 +503,15 @@ with tab4:
                 if selected == rq['meaning']:
                     dmg = random.randint(15, 25)
                     st.session_state.monster_hp = max(0, st.session_state.monster_hp - dmg)
-                    autoplay_audio("That is correct! Attack!") 
+                    queue_feedback_audio("That is correct! Attack!")
                     st.toast(f"⚔️ 攻擊成功！造成 {dmg} 點傷害！", icon="💥")
-                    update_learning_status(df, rq['word'], new_level=4)
+                    update_learning_status(progress, rq['word'], new_level=4)
                 else:
                     dmg = random.randint(10, 20)
                     st.session_state.player_hp = max(0, st.session_state.player_hp - dmg)
-                    autoplay_audio("Wrong! You take damage.")
+                    queue_feedback_audio("Wrong! You take damage.")
                     st.toast(f"🛡️ 答錯了！受到 {dmg} 點傷害！", icon="🩸")
-                    update_learning_status(df, rq['word'], new_level=1)
+                    update_learning_status(progress, rq['word'], new_level=1)
                 
                 if st.session_state.monster_hp == 0:
                     st.session_state.game_status = "win"
@@ -477,31 +525,129 @@ with tab4:
                 st.rerun()
 
 # === TAB 5: 總表 ===
-with tab5:
+elif active_tab == TAB_TABLE:
     st.markdown("### 📊 完整單字庫")
-    search_term = st.text_input("🔍 搜尋單字", "")
+    search_term = st.text_input("🔍 搜尋單字 / 中文 / 例句 (可容錯拼字)", "")
     
     if search_term:
-        display_df = df[df['word'].str.contains(search_term, case=False, na=False)]
+        # 依相關度排序的列位置，同一個關鍵字翻頁時直接用快取
+        display_pos = load_derived('search', SearchIndex, VOCAB_FILE).search(search_term)
     else:
-        if selected_cat != "全部 (All)":
-            display_df = df[df['type'] == selected_cat]
-        else:
-            display_df = df
+        display_pos = view.positions(None if selected_cat == "全部 (All)" else selected_cat)
 
     col_t1, col_t2 = st.columns([1, 1])
-    with col_t1: st.write(f"**總筆數:** {len(display_df)}")
+    with col_t1: st.write(f"**總筆數:** {len(display_pos)}")
     with col_t2: show_all = st.checkbox("顯示全部")
 
-    view_cols = ['week', 'type', 'word', 'phonetic', 'meaning', 'level', 'last_review_date']
+    view_cols = ['week', 'type', 'word', 'phonetic', 'meaning']
+
+    def progress_table(positions):
+        # 只為要顯示的列補上這個 session 的進度欄位
+        positions = list(positions)
+        return df.iloc[positions][view_cols].assign(level=progress.levels_for(positions),
+                                                     last_review_date=progress.dates_for(positions))
 
     if show_all:
-        st.dataframe(display_df[view_cols])
+        st.dataframe(progress_table(display_pos))
     else:
         PAGE_SIZE = 50
-        total_pages = max(1, (len(display_df) // PAGE_SIZE) + 1)
+        total_pages = max(1, (len(display_pos) // PAGE_SIZE) + 1)
         col_p1, col_p2 = st.columns([1, 3])
         with col_p1: page_num = st.number_input("頁碼", 1, total_pages, 1)
         start_idx = (page_num - 1) * PAGE_SIZE
         end_idx = start_idx + PAGE_SIZE
-        st.dataframe(display_df[view_cols].iloc[start_idx:end_idx])
+        st.dataframe(progress_table(display_pos[start_idx:end_idx]))
+
+# === TAB 6: 快速回合 ===
+elif active_tab == TAB_ROUND:
+    st.markdown("### ⚡ 快速回合")
+    st.caption("一次出一整回合，在瀏覽器裡作答，答完才送出一次")
+    round_labels = {'flashcard': "🔥 閃卡", 'quiz': "⚔️ 擂台"}
+    c_kind, c_size, c_go = st.columns([2, 2, 1])
+    with c_kind: round_kind = st.radio("題型", list(round_labels), format_func=round_labels.get, horizontal=True)
+    with c_size: round_size = st.slider("題數", 5, 50, ROUND_SIZE, step=5)
+    with c_go:
+        st.write("")
+        start_round = st.button("🚀 開始", use_container_width=True)
+
+    if start_round:
+        if round_kind == 'quiz' and len(pool_pos) < 4:
+            st.warning("單字量不足 (至少需要4個)。")
+        else:
+            old = st.session_state.round
+            if old is not None and old['kind'] == 'flashcard' and st.session_state.round_applied != old['id']:
+                # 上一回合沒送出就重開: 拿出來的閃卡放回隊伍
+                for item in old['items']:
+                    st.session_state.fc_queue.requeue(item['pos'])
+            if round_kind == 'flashcard':
+                # 閃卡照到期順序從同一個隊伍拿
+                fc_queue = flashcard_queue()
+                positions = []
+                while len(positions) < round_size:
+                    pos = fc_queue.pop()
+                    if pos is None:
+                        break
+                    positions.append(pos)
+            else:
+                positions = random.sample(pool_pos.tolist(), min(round_size, len(pool_pos)))
+            audio_url = None
+            if AUDIO_BY_URL:
+                # 語音先在背景合成，網址現在就能給
+                audio_cache = get_audio_cache()
+                words = df['word'].take(positions).tolist()
+                _audio_jobs.submit(audio_cache.prewarm, words, to_disk=True)
+                audio_url = lambda w: audio_cache.url_for(audio_key(w))
+            st.session_state.round_seq += 1
+            st.session_state.round = build_round(st.session_state.round_seq, round_kind, df, positions,
+                                                 get_distractors() if round_kind == 'quiz' else None, hard_mode, audio_url)
+
+    rnd = st.session_state.round
+    if rnd is not None and rnd['items']:
+        result = round_player(rnd, key=f"round_{rnd['id']}")
+        if result and result.get('id') == rnd['id'] and st.session_state.round_applied != rnd['id']:
+            with span('round.apply'):
+                n_correct, n_answered = apply_round_results(progress, rnd, result.get('answers'))
+            st.session_state.round_applied = rnd['id']
+            st.session_state.round_summary = (n_correct, n_answered)
+        if st.session_state.round_applied == rnd['id']:
+            n_correct, n_answered = st.session_state.round_summary
+            st.success(f"已記錄 {n_answered} 題，{'記得' if rnd['kind'] == 'flashcard' else '答對'} {n_correct} 題")
+    elif rnd is not None:
+        st.info("這個範圍目前沒有可出的題目")
+
+# === TAB 7: 學習分析 ===
+elif active_tab == TAB_STATS:
+    st.markdown("### 📈 學習分析")
+    class_view = PROGRESS_BACKEND == "sqlite" and st.toggle("👥 全班統計", key="analytics_class")
+    with span('render.analytics'):
+        report = load_derived('analytics', Analytics, VOCAB_FILE).report(
+            get_review_log(), None if class_view else (st.session_state.user_id or "default"))
+        if not report['reviews']:
+            st.info("還沒有作答紀錄，先去練習幾題吧！")
+        else:
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("作答次數", report['reviews'])
+            m2.metric("正確率", f"{report['accuracy'] * 100:.0f}%")
+            m3.metric("連續天數", f"{report['current_streak']} 天")
+            m4.metric("最長連續", f"{report['longest_streak']} 天", help=f"總共練習 {report['active_days']} 天")
+
+            st.markdown("#### 🧠 記憶保留 (距上次複習天數 → 答對率 %)")
+            group_labels = {'week': "依週次", 'type': "依分類"}
+            group_by = st.radio("分組", list(group_labels), format_func=group_labels.get, horizontal=True,
+                                key="analytics_group", label_visibility="collapsed")
+            st.line_chart(report['retention'][group_by])
+
+            st.markdown("#### 📊 等級分布變化")
+            st.area_chart(report['levels'])
+
+            st.markdown("#### ❌ 最常答錯")
+            st.dataframe(report['missed'], hide_index=True, use_container_width=True)
+
+# 回饋語音放在最後播: 這一輪排進去、已經合成好的才播
+play_pending_audio()
+end_rerun(SESSION_ID)
+
+# TOEIC_PROFILE=1 時在側邊欄最下面顯示這個 session 的效能數據
+if PROFILE_ENABLED:
+    with st.sidebar.expander("🛠️ 效能分析"):
+        st.json(profile_snapshot(SESSION_ID))
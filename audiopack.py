@@ -0,0 +1,186 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from metrics import incr, span
+
+AUDIO_PACK_FILE = "toeic_audio.pack"  # 存在時 App 直接從這裡播，不用合成
+
+# 語音包: 單一檔案 = 音檔資料 | 索引 (依 key 排序) | meta JSON | 固定長度結尾。
+# 用 mmap 開，索引直接 frombuffer 二分搜尋，開檔不用讀整個檔案也不用建 dict
+MAGIC = b'TOEICAP1'
+TRAILER = struct.Struct('<8sQII')  # magic, 索引位置, 筆數, meta 長度
+INDEX_DTYPE = np.dtype([('key', 'S20'), ('offset', '<u8'), ('size', '<u4'), ('codec', 'u1')])
+CODEC_RAW, CODEC_ZLIB = 0, 1
+
+class AudioPack:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size < TRAILER.size:
+                raise ValueError(f"{path}: 不是語音包")
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_at, count, meta_len = TRAILER.unpack_from(self._mm, len(self._mm) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: 不是語音包")
+        self._index = np.frombuffer(self._mm, INDEX_DTYPE, count, index_at)
+        meta_at = index_at + count * INDEX_DTYPE.itemsize
+        self.meta = json.loads(bytes(self._mm[meta_at:meta_at + meta_len]).decode('utf-8'))
+        self.ext = self.meta.get('ext', 'mp3')
+
+    def __len__(self):
+        return len(self._index)
+
+    def _find(self, key):
+        k = bytes.fromhex(key)
+        i = int(np.searchsorted(self._index['key'], k))
+        # numpy 取出 S20 的元素會去掉結尾的 \0，比對時 key 也要去掉
+        if i < len(self._index) and self._index['key'][i] == k.rstrip(b'\0'):
+            return self._index[i]
+        return None
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def get(self, key):
+        # key 是 tts.audio_key 的十六進位字串；沒有就回傳 None
+        entry = self._find(key)
+        if entry is None:
+            return None
+        start = int(entry['offset'])
+        data = self._mm[start:start + int(entry['size'])]
+        return zlib.decompress(data) if entry['codec'] == CODEC_ZLIB else data
+
+    def keys(self):
+        return [k.hex() for k in self._index['key'].tolist()]
+
+    def close(self):
+        self._index = None
+        self._mm.close()
+
+def _encode(data):
+    # mp3 本身已經壓過，zlib 省不到 1 成就存原始資料
+    packed = zlib.compress(data, 6)
+    if len(packed) < len(data) * 0.9:
+        return packed, CODEC_ZLIB
+    return data, CODEC_RAW
+
+def write_pack(entries, output, meta):
+    # entries: 依序產生 (key, 音檔 bytes)；重複的 key 保留第一筆
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    rows, seen = [], set()
+    try:
+        with open(tmp_path, 'wb') as fh:
+            for key, data in entries:
+                if key in seen:
+                    continue
+                seen.add(key)
+                blob, codec = _encode(data)
+                rows.append((bytes.fromhex(key), fh.tell(), len(blob), codec))
+                fh.write(blob)
+            index = np.array(sorted(rows), dtype=INDEX_DTYPE)
+            index_at = fh.tell()
+            meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+            fh.write(index.tobytes())
+            fh.write(meta_bytes)
+            fh.write(TRAILER.pack(MAGIC, index_at, len(index), len(meta_bytes)))
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(rows)
+
+def pack_texts(df_vocab):
+    # 跟 App 播放時一樣的清理: 單字、例句、回饋語音，去掉空白 / nan 和重複
+    from tts import FEEDBACK_LINES
+    texts = FEEDBACK_LINES + df_vocab['word'].tolist() + df_vocab['sentence'].tolist()
+    cleaned = (str(t).strip() for t in texts)
+    return list(dict.fromkeys(t for t in cleaned if t and t != 'nan'))
+
+def build_pack(texts, output=AUDIO_PACK_FILE, backend_name=None, lang='en', workers=8):
+    # 全部合成進一個語音包；舊的包是同一個引擎產生的就沿用裡面已有的，只合成新的文字。
+    # 合成失敗的文字不會進包 (App 播到時再當場合成)，數量和錯誤訊息會回報
+    from tts import audio_key, get_backend
+    backend_name, backend = get_backend(backend_name)
+    ext = getattr(backend, 'ext', 'mp3')
+    old = None
+    if os.path.exists(output):
+        try:
+            old = AudioPack(output)
+        except (OSError, ValueError):
+            old = None
+        if old is not None and (old.meta.get('backend'), old.meta.get('lang')) != (backend_name, lang):
+            old.close()
+            old = None
+
+    keys = {t: audio_key(t, lang) for t in texts}
+    todo = [t for t, k in keys.items() if old is None or k not in old]
+    result = {'texts': len(keys), 'reused': len(keys) - len(todo), 'rendered': 0, 'failed': 0, 'errors': [],
+              'output': os.path.abspath(output)}
+    if old is not None and not todo and len(old) == len(set(keys.values())):
+        # 文字完全沒變: 舊的包就是答案，不用重寫
+        result['entries'] = len(old)
+        old.close()
+        return result
+    rendered = {}
+    lock = threading.Lock()
+
+    def render(text):
+        data = backend(text, lang)
+        with lock:
+            rendered[keys[text]] = data
+
+    with span('audiopack.render'), ThreadPoolExecutor(max_workers=workers) as pool:
+        futs = {pool.submit(render, t): t for t in todo}
+        for fut in as_completed(futs):
+            try:
+                fut.result()
+                result['rendered'] += 1
+            except Exception as e:
+                result['failed'] += 1
+                incr('audiopack.failed')
+                if len(result['errors']) < 5:
+                    result['errors'].append(f"{futs[fut]!r}: {e!r}")
+
+    def entries():
+        for key in keys.values():
+            data = rendered.get(key)
+            if data is None and old is not None:
+                data = old.get(key)
+            if data is not None:
+                yield key, data
+        if old is not None:
+            old.close()  # 換檔前先關掉舊的 mmap (Windows 上開著不能取代)
+
+    meta = {'backend': backend_name, 'lang': lang, 'ext': ext}
+    with span('audiopack.write'):
+        try:
+            result['entries'] = write_pack(entries(), output, meta)
+        finally:
+            if old is not None:
+                old.close()
+    return result
+
+if __name__ == "__main__":
+    # 例: python audiopack.py --backend espeak   (離線，不需要網路)
+    from tts import BACKENDS
+    from vocab import data_source, load_vocab
+    parser = argparse.ArgumentParser(description="把單字表裡所有單字與例句預先合成成一個語音包")
+    parser.add_argument('--data', default=data_source())
+    parser.add_argument('--output', default=AUDIO_PACK_FILE)
+    parser.add_argument('--backend', choices=list(BACKENDS), help="預設用 TOEIC_TTS_BACKEND (沒設就是 gtts)")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    result = build_pack(pack_texts(load_vocab(args.data)), args.output, args.backend, workers=args.workers)
+    print(f"{result['texts']} 段文字: 沿用 {result['reused']}，合成 {result['rendered']}，失敗 {result['failed']} "
+          f"→ {result['output']} ({result['entries']} 筆)")
+    for err in result['errors']:
+        print(f"  失敗: {err}")
+    if result['failed']:
+        raise SystemExit(1)
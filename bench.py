@@ -0,0 +1,626 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import vocab
+from vocab import EXPECTED_COLS, build_word_index
+from progress import SessionProgress
+from quiz import DistractorIndex
+from search import SearchIndex
+
+# 效能量測腳本: python bench.py <項目> [--sizes 5000 50000 ...]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, ".toeic_cache", "bench")
+
+def synthetic_vocab(n, n_types=20, n_weeks=12, seed=0):
+    rng = random.Random(seed)
+    words = [f"w{i:07d}" for i in range(n)]
+    df_vocab = pd.DataFrame({
+        'word': words,
+        'meaning': [f"意思{i % max(1, n // 2)}" for i in range(n)],
+        'phonetic': [f"/{w}/" for w in words],
+        'sentence': [f"This is the example sentence for {w}." for w in words],
+        'sentence_cn': [f"這是 {w} 的例句。" for w in words],
+        'type': [f"Type {rng.randrange(n_types)}" for _ in range(n)],
+        'week': [str(rng.randrange(1, n_weeks + 1)) for _ in range(n)],
+    })
+    return df_vocab
+
+def _timeit(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+def _report(name, rows):
+    print(f"\n== {name} ==")
+    for row in rows:
+        print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+def bench_answer(sizes, repeat=200):
+    # 作答時的 level / 日期更新: 舊版在整張表上用布林遮罩 vs 現在的 word 索引 + session 進度 (SessionProgress)
+    rows = []
+    for n in sizes:
+        df = synthetic_vocab(n).assign(level=1, last_review_date='')
+        word_index = build_word_index(df)
+        progress = SessionProgress()
+        words = df['word'].sample(repeat, replace=True, random_state=1).tolist()
+        it = iter(words * 2)
+
+        def mask_update():
+            w = next(it)
+            lvl = df.loc[df['word'] == w, 'level'].values[0]
+            idx = df[df['word'] == w].index[0]
+            df.loc[idx, 'level'] = min(4, lvl + 1)
+            df.loc[idx, 'last_review_date'] = '2024-01-01'
+
+        def session_update():
+            pos = word_index[next(it)]
+            progress.update(pos, min(4, progress.level(pos) + 1), '2024-01-01')
+
+        t_mask = _timeit(mask_update, repeat)
+        it = iter(words * 2)
+        t_session = _timeit(session_update, repeat)
+        rows.append({'n': n, 'mask_us': round(t_mask * 1e6, 1), 'session_us': round(t_session * 1e6, 2),
+                     'speedup': f"{t_mask / t_session:.0f}x"})
+    _report("per-answer update latency", rows)
+
+def bench_distractor(sizes, n_questions=20_000):
+    # 出題 (正解 + 3 個不重複干擾項): 舊版 df.sample vs DistractorIndex
+    rows = []
+    for n in sizes:
+        df = synthetic_vocab(n)
+        t0 = time.perf_counter()
+        index = DistractorIndex(df)
+        t_build = time.perf_counter() - t0
+        meanings = df['meaning'].tolist()
+        types = df['type'].tolist()
+        picks = [random.randrange(n) for _ in range(n_questions)]
+
+        t_old = _timeit(lambda: df[df['meaning'] != meanings[picks[0]]].sample(3)['meaning'].tolist(), 50)
+        t0 = time.perf_counter()
+        for i in picks:
+            index.options(meanings[i])
+        t_new = (time.perf_counter() - t0) / n_questions
+        t0 = time.perf_counter()
+        for i in picks:
+            index.options(meanings[i], bucket=('type', types[i]))
+        t_hard = (time.perf_counter() - t0) / n_questions
+        rows.append({'n': n, 'build_ms': round(t_build * 1e3, 1), 'old_qps': int(1 / t_old),
+                     'index_qps': int(1 / t_new), 'hard_qps': int(1 / t_hard)})
+    _report("question generation throughput", rows)
+
+def bench_search(sizes, queries=('w00012', '0123', 'example', '意思1', 'w0001x34', 'w00x12', 'zz0012')):
+    # 總表搜尋: 舊版 str.contains (只搜 word) vs SearchIndex (word + 意思 + 例句，含排序與容錯)
+    rows = []
+    for n in sizes:
+        df = synthetic_vocab(n)
+        t0 = time.perf_counter()
+        index = SearchIndex(df)
+        t_build = time.perf_counter() - t0
+        for q in queries:
+            t_old = _timeit(lambda: df[df['word'].str.contains(q, case=False, na=False)], 5)
+            t_old_all = _timeit(lambda: df[df['word'].str.contains(q, case=False, na=False)
+                                           | df['meaning'].str.contains(q, case=False, na=False)
+                                           | df['sentence'].str.contains(q, case=False, na=False)], 5)
+            t_cold = _timeit(lambda: index._rank(q), 5)
+            index.search(q)
+            t_page = _timeit(lambda: index.search(q)[50:100], 200)
+            rows.append({'n': n, 'query': q, 'hits': len(index.search(q)), 'build_s': round(t_build, 2),
+                         'contains_ms': round(t_old * 1e3, 2), 'contains_3col_ms': round(t_old_all * 1e3, 2),
+                         'index_ms': round(t_cold * 1e3, 2), 'cached_page_us': round(t_page * 1e6, 1)})
+    _report("search latency", rows)
+
+def _stub_tts(text, lang):
+    return b'ID3' + text.encode('utf-8')
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def _progress_bytes():
+    # 先等 persist 佇列寫完，再算實際寫出的位元組 (journal 追加 + 壓縮重寫)，不是最後的檔案大小
+    from jobs import get_job_queue
+    from progress import get_journal
+    get_job_queue('persist').flush()
+    journal = get_journal()
+    while journal._compacting:  # 背景壓縮不在佇列裡，另外等
+        time.sleep(0.01)
+    return journal.bytes_written
+
+def _prepare_workdir(n):
+    # 暫存目錄 + 合成單字表 + 假的語音合成器，整個 app 可以離線跑
+    import atexit
+    import tts
+    work = tempfile.mkdtemp(prefix='toeic-bench-')
+    atexit.register(shutil.rmtree, work, True)  # 最先註冊、最後執行: 背景工作寫完才刪
+    os.chdir(work)
+    shutil.copytree(os.path.join(REPO_DIR, '.streamlit'), '.streamlit')
+    # Excel 只當快取鍵用，內容直接寫成 parquet 快照 (百萬筆寫 xlsx 太慢)
+    with open(vocab.DATA_FILE, 'wb') as fh:
+        fh.write(b'synthetic')
+    vocab._write_snapshot(synthetic_vocab(n)[EXPECTED_COLS], vocab._snapshot_path(vocab.file_key(vocab.DATA_FILE)))
+    tts.install_audio_cache(tts.AudioCache(os.path.join(work, 'audio'), backend=_stub_tts))
+    return work
+
+def _show_tab(at, index):
+    # App 只跑選到的分頁，操作某一頁的按鈕前要先切過去
+    from ui import TABS
+    at.radio(key='active_tab').set_value(TABS[index]).run()
+
+def _current_rss_mb():
+    with open('/proc/self/statm') as fh:
+        return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+def apptest_session(n, rounds=20):
+    # 在暫存目錄用合成單字表跑一個完整 session: 翻卡、測驗、RPG、拼字、搜尋
+    import resource
+    from streamlit.testing.v1 import AppTest
+
+    _prepare_workdir(n)
+    at = AppTest.from_file(os.path.join(REPO_DIR, 'app.py'), default_timeout=3600)
+    t0 = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    timings = {}
+    def step(name, action):
+        t = time.perf_counter()
+        action()
+        timings.setdefault(name, []).append(time.perf_counter() - t)
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].message}")
+
+    def button(label=None, key=None):
+        return next(b for b in at.button if (key is None or b.key == key) and (label is None or b.label == label))
+
+    for i in range(rounds):
+        step('tab', lambda: _show_tab(at, 0))
+        step('flashcard', lambda: button('🔄 翻轉').click().run())
+        step('flashcard', lambda: button('✅ 記得' if i % 2 else '❌ 陌生').click().run())
+        step('flashcard', lambda: button('➡️ 下一張').click().run())
+        step('tab', lambda: _show_tab(at, 1))
+        step('quiz', lambda: button(key=f"q_{i % 4}").click().run())
+        step('tab', lambda: _show_tab(at, 3))
+        if at.session_state['game_status'] != 'playing':
+            step('rpg', lambda: button('🔄 重置遊戲').click().run())
+        step('rpg', lambda: button(key=f"rpg_{i % 4}").click().run())
+        step('tab', lambda: _show_tab(at, 2))
+        answer = vocab.load_vocab(vocab.DATA_FILE)['word'].iat[at.session_state['spell_q']] if i % 2 else 'wrong'
+        step('spell', lambda: at.text_input(key='spell_input_box').input(answer).run())
+        step('spell', lambda: button('送出檢查').click().run())
+        step('tab', lambda: _show_tab(at, 4))
+        step('search', lambda: next(t for t in at.text_input if t.label.startswith('🔍')).input(f"w{i:05d}").run())
+
+    all_runs = [t for ts in timings.values() for t in ts]
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        'n': n,
+        'cold_start_ms': ms(cold),
+        'reruns': len(all_runs),
+        'p50_ms': ms(_percentile(all_runs, 50)),
+        'p95_ms': ms(_percentile(all_runs, 95)),
+        'by_action': {k: {'p50_ms': ms(_percentile(v, 50)), 'p95_ms': ms(_percentile(v, 95))} for k, v in timings.items()},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'progress_bytes': _progress_bytes(),
+    }
+
+def bench_sessions(sizes, n_sessions=8):
+    # 同一個行程開多個 session，量每多一個 session 增加多少記憶體
+    import gc
+    from streamlit.testing.v1 import AppTest
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        _prepare_workdir(n)
+        sessions, rss = [], []
+        for i in range(n_sessions + 1):
+            at = AppTest.from_file(os.path.join(REPO_DIR, 'app.py'), default_timeout=3600)
+            at.run()
+            _show_tab(at, 1)
+            next(b for b in at.button if b.key == 'q_0').click().run()
+            sessions.append(at)
+            gc.collect()
+            rss.append(_current_rss_mb())
+        # 第一個 session 會順便建共用的索引，從第二個開始算
+        per_session = (rss[-1] - rss[0]) / n_sessions
+        rows.append({'n': n, 'sessions': n_sessions, 'first_session_rss_mb': round(rss[0], 1),
+                     'per_extra_session_mb': round(per_session, 2)})
+        os.chdir(cwd)
+    _report("memory per additional session", rows)
+
+def bench_round(sizes, n_cards=20):
+    # 作答 N 張閃卡: 每張按鈕都 rerun (翻轉、記得) vs 回合模式 (開始 + 送出共 2 次 rerun)
+    import rounds as round_mode
+    from streamlit.testing.v1 import AppTest
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        _prepare_workdir(n)
+        at = AppTest.from_file(os.path.join(REPO_DIR, 'app.py'), default_timeout=3600)
+        at.run()
+
+        def click(label):
+            next(b for b in at.button if b.label == label).click().run()
+
+        t0 = time.perf_counter()
+        reruns = 0
+        for _ in range(n_cards):
+            click('🔄 翻轉')
+            click('✅ 記得')
+            reruns += 3  # 記得 裡面還有一次 st.rerun
+        t_single = time.perf_counter() - t0
+
+        # AppTest 沒辦法操作 custom component，直接換成回傳整批作答的假元件
+        submitted = {}
+        real_player = round_mode.round_player
+        round_mode.round_player = lambda payload, key: submitted.get(payload['id'])
+        try:
+            _show_tab(at, 5)
+            next(r for r in at.radio if r.label == '題型').set_value('flashcard').run()
+            at.slider[0].set_value(n_cards).run()
+            t0 = time.perf_counter()
+            click('🚀 開始')
+            rnd = at.session_state['round']
+            submitted[rnd['id']] = {'id': rnd['id'], 'answers': [[i, 1] for i in range(len(rnd['items']))]}
+            at.run()
+            t_round = time.perf_counter() - t0
+        finally:
+            round_mode.round_player = real_player
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        rows.append({'n': n, 'cards': n_cards, 'single_reruns': reruns, 'single_ms': round(t_single * 1000, 1),
+                     'round_reruns': 2, 'round_ms': round(t_round * 1000, 1),
+                     'speedup': f"{t_single / t_round:.1f}x"})
+        os.chdir(cwd)
+    _report(f"answering {n_cards} flashcards: one rerun per click vs one round", rows)
+
+def bench_prefetch(sizes, n_questions=20, tts_ms=150):
+    # 作答後下一題: 當場抽題 + 按發音才合成 vs 背景預抽好的題目 (語音已在快取)。
+    # 假的 TTS 每次睡 tts_ms 模擬網路；每題之間等背景做完，當作使用者看題的時間
+    import prefetch
+    import tts
+    from jobs import get_job_queue
+    from streamlit.testing.v1 import AppTest
+
+    def slow_tts(text, lang):
+        time.sleep(tts_ms / 1000)
+        return _stub_tts(text, lang)
+
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        row = {'n': n, 'questions': n_questions, 'tts_ms': tts_ms}
+        for label, size in (('sync', 0), ('prefetch', prefetch.PREFETCH_SIZE or 3)):
+            work = _prepare_workdir(n)
+            tts.install_audio_cache(tts.AudioCache(os.path.join(work, 'audio'), backend=slow_tts))
+            prefetch.PREFETCH_SIZE = size
+            at = AppTest.from_file(os.path.join(REPO_DIR, 'app.py'), default_timeout=3600)
+            at.run()
+            _show_tab(at, 1)
+            jobs = get_job_queue('prefetch')
+            latencies = []
+            for i in range(n_questions):
+                jobs.flush()
+                t0 = time.perf_counter()
+                next(b for b in at.button if b.key == f"q_{i % 4}").click().run()
+                next(b for b in at.button if b.key == 'quiz_audio_btn').click().run()
+                latencies.append(time.perf_counter() - t0)
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            row[f"{label}_p50_ms"] = round(_percentile(latencies, 50) * 1000, 1)
+            row[f"{label}_p95_ms"] = round(_percentile(latencies, 95) * 1000, 1)
+            os.chdir(cwd)
+        rows.append(row)
+    _report("quiz: answer + play the next question's audio", rows)
+
+def bench_audiopack(sizes, lookups=20_000):
+    # 語音包: 建包 / 開檔時間、檔案大小，以及查音檔 (mmap 語音包 vs 磁碟快取) 的延遲
+    import audiopack
+    import tts
+    tts.BACKENDS['stub'] = _stub_tts
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        work = tempfile.mkdtemp(prefix='toeic-bench-')
+        os.chdir(work)
+        texts = audiopack.pack_texts(synthetic_vocab(n))
+        t0 = time.perf_counter()
+        result = audiopack.build_pack(texts, 'audio.pack', 'stub')
+        t_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        result_again = audiopack.build_pack(texts, 'audio.pack', 'stub')
+        t_rebuild = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pack = audiopack.AudioPack('audio.pack')
+        t_open = time.perf_counter() - t0
+
+        sample = random.Random(0).choices(texts, k=lookups)
+        keys = [tts.audio_key(t) for t in sample]
+        it = iter(keys)
+        t_pack = _timeit(lambda: pack.get(next(it)), lookups)
+        disk = tts.AudioCache('audio', backend=_stub_tts, max_memory_bytes=0)
+        disk.prewarm(set(sample))
+        it = iter(sample)
+        t_disk = _timeit(lambda: disk.get(next(it)), lookups)
+        pack.close()
+        rows.append({'n': n, 'clips': result['entries'], 'pack_mb': round(os.path.getsize('audio.pack') / 1e6, 1),
+                     'build_s': round(t_build, 2), 'no_change_s': round(t_rebuild, 2),
+                     'reused': result_again['reused'], 'open_ms': round(t_open * 1000, 2),
+                     'pack_get_us': round(t_pack * 1e6, 1), 'disk_get_us': round(t_disk * 1e6, 1)})
+        os.chdir(cwd)
+        shutil.rmtree(work, True)
+    _report("audio pack: build / open / lookup vs per-file disk cache", rows)
+
+def bench_import(sizes, n_sources=4):
+    # 多個 CSV 來源: 一次全讀進 pandas 再去重 vs 串流匯入 (冷啟動 / 沒變動 / 改一個來源)
+    import importer
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        tmp = tempfile.mkdtemp(prefix="toeic-import-")
+        os.chdir(tmp)
+        df = synthetic_vocab(n)[EXPECTED_COLS]
+        step = n // n_sources
+        sources = []
+        for i in range(n_sources):
+            # 每個來源多帶前一段的 5% 單字，模擬不同書重複收錄
+            part = df.iloc[max(0, i * step - step // 20):(i + 1) * step]
+            sources.append(f"book{i}.csv")
+            part.to_csv(sources[-1], index=False)
+
+        def load_all():
+            frames = [pd.read_csv(p, dtype=str, keep_default_na=False) for p in sources]
+            return vocab.normalize_vocab(pd.concat(frames, ignore_index=True))
+
+        t_pandas = _timeit(load_all, 1)
+        t_cold = _timeit(lambda: importer.compile_sources(sources), 1)
+        t_noop = _timeit(lambda: importer.compile_sources(sources), 3)
+        os.utime(sources[-1], ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        t_one = _timeit(lambda: importer.compile_sources(sources), 1)
+        t_open = _timeit(lambda: vocab.compact_vocab(pd.read_parquet(vocab.COMPILED_FILE)), 3)
+        words = len(pd.read_parquet(vocab.COMPILED_FILE, columns=['word']))
+        rows.append({'n': n, 'words': words, 'pandas_all_ms': round(t_pandas * 1000, 1),
+                     'import_cold_ms': round(t_cold * 1000, 1), 'import_noop_ms': round(t_noop * 1000, 2),
+                     'import_one_changed_ms': round(t_one * 1000, 1), 'open_compiled_ms': round(t_open * 1000, 1)})
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+    _report("vocab import (multiple CSV sources)", rows)
+
+CLASS_PAGE_BUDGET_MS = 100
+
+def bench_analytics(sizes, n_users=30, per_day=200, days=365):
+    # 一年份、全班的作答紀錄: 冷載入、個人 / 全班報表、新增一筆後重算
+    from analytics import Analytics
+    from progress import EVENT_DTYPE, ReviewLog
+    rows = []
+    for n in sizes:
+        cwd = os.getcwd()
+        tmp = tempfile.mkdtemp(prefix="toeic-analytics-")
+        os.chdir(tmp)
+        df = synthetic_vocab(n)
+        rng = np.random.default_rng(0)
+        total = n_users * per_day * days
+        events = np.empty(total, EVENT_DTYPE)
+        start = 738000
+        events['day'] = start + np.repeat(np.arange(days), n_users * per_day)
+        events['user'] = np.tile(np.repeat(np.arange(n_users), per_day), days)
+        events['word'] = rng.integers(0, n, total)
+        events['old'] = rng.integers(1, 5, total)
+        events['new'] = np.where(rng.random(total) < 0.7, np.minimum(events['old'] + 1, 4), 1)
+        events['gap'] = np.where(rng.random(total) < 0.2, -1, rng.integers(0, 40, total))
+        events['first'] = events['gap'] < 0
+        events.tofile('review_events.bin')
+        with open('review_events.bin.words', 'w', encoding='utf-8') as fh:
+            fh.writelines(w + '\n' for w in df['word'].tolist())
+        with open('review_events.bin.users', 'w', encoding='utf-8') as fh:
+            fh.writelines(f"user{u}\n" for u in range(n_users))
+
+        today = datetime.date.fromordinal(start + days - 1)
+        log = ReviewLog('review_events.bin')
+        t_load = _timeit(log.snapshot, 1)
+        analytics = Analytics(df)
+        t_user = _timeit(lambda: analytics.report(log, 'user3', today), 1)
+        t_class = _timeit(lambda: analytics.report(log, None, today), 1)
+        t_cached = _timeit(lambda: analytics.report(log, 'user3', today), 20)
+        log.record('user3', [(df['word'].iat[0], 2, 3, 1, today.toordinal())])
+        t_after = _timeit(lambda: analytics.report(log, 'user3', today), 1)
+        # 新行程的第一次寫入: 補讀整份紀錄 + 建這個使用者出現過哪些字 (判斷 first)
+        fresh = ReviewLog('review_events.bin')
+        t_first_write = _timeit(lambda: fresh.record('user5', [(df['word'].iat[1], 1, 2, 3, today.toordinal())]), 1)
+        # 全班統計頁 (預算 CLASS_PAGE_BUDGET_MS): 新行程直接開頁 = 冷載入 + 全班報表；
+        # persist 執行緒先 follow (補算，背景) 再有新作答之後開頁 = 只剩畫圖
+        cold_log, cold = ReviewLog('review_events.bin'), Analytics(df)
+        t_class_cold = _timeit(lambda: cold.report(cold_log, None, today), 1)
+        followed_log, followed = ReviewLog('review_events.bin'), Analytics(df)
+        t_follow = _timeit(lambda: followed.follow(followed_log), 1)
+        followed_log.record('user7', [(df['word'].iat[2], 2, 3, 1, today.toordinal())])
+        t_class_page = _timeit(lambda: followed.report(followed_log, None, today), 1)
+        rows.append({'n': n, 'events': total, 'load_ms': round(t_load * 1000, 1),
+                     'user_report_ms': round(t_user * 1000, 1), 'class_report_ms': round(t_class * 1000, 1),
+                     'cached_ms': round(t_cached * 1000, 3), 'after_new_answer_ms': round(t_after * 1000, 1),
+                     'first_write_ms': round(t_first_write * 1000, 1),
+                     'class_cold_ms': round(t_class_cold * 1000, 1), 'class_follow_bg_ms': round(t_follow * 1000, 1),
+                     'class_page_ms': round(t_class_page * 1000, 1),
+                     'class_page_ok': t_class_page * 1000 <= CLASS_PAGE_BUDGET_MS})
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+    _report(f"analytics over {days} days x {n_users} users x {per_day} reviews/day", rows)
+
+class _FakeWorksheet:
+    # 只有 append_rows，記下每次收到的列
+    def __init__(self):
+        self.batches = []
+
+    def append_rows(self, rows):
+        self.batches.append(rows)
+
+def bench_sheets(sizes, n_users=30):
+    # SQLite -> Google Sheets 背景同步的時間 (用假的 worksheet)；行為檢查在 tests/test_progress.py
+    from progress import ProgressDB, SheetsSync
+    rows = []
+    for n in sizes:
+        tmp = tempfile.mkdtemp(prefix="toeic-sheets-")
+        db = ProgressDB(os.path.join(tmp, 'progress.db'), flush_interval=3600)
+        sheet = _FakeWorksheet()
+        sync = SheetsSync(db, sheet)
+        words = [f"w{i:07d}" for i in range(n)]
+        t_record = _timeit(lambda: [db.record_many(f"user{u}", [(w, 2, '2024-01-01') for w in words[u::n_users]])
+                                    for u in range(n_users)], 1)
+        t_first = _timeit(sync.sync_once, 1)
+        t_idle = _timeit(sync.sync_once, 5)
+        db.record('user0', words[0], 3, '2024-01-02')
+        t_one = _timeit(sync.sync_once, 1)
+        db.close()
+        rows.append({'n': n, 'record_ms': round(t_record * 1000, 1), 'first_sync_ms': round(t_first * 1000, 1),
+                     'idle_sync_ms': round(t_idle * 1000, 2), 'one_change_sync_ms': round(t_one * 1000, 2)})
+        shutil.rmtree(tmp, ignore_errors=True)
+    _report("sqlite -> sheets sync (fake worksheet)", rows)
+
+def _git_rev():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+def _save_and_compare(kind, rounds, rows, compare, keys):
+    # 結果存成 .toeic_cache/bench/<項目>-<commit>.json；有給 --compare 就逐個大小列出 keys 的變化
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{kind}-{_git_rev()}.json")
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump({'rev': _git_rev(), 'rounds': rounds, 'results': rows}, fh, indent=2)
+    print(f"\n結果已存到 {path}")
+    if not compare:
+        return
+    with open(compare, encoding='utf-8') as fh:
+        base = {r['n']: r for r in json.load(fh)['results'] if 'error' not in r}
+    diffs = []
+    for r in rows:
+        b = base.get(r['n'])
+        if b and 'error' not in r:
+            diffs.append({'n': r['n'], **{k: f"{b[k]} -> {r[k]} ({(r[k] - b[k]) / b[k] * 100:+.0f}%)" if b[k] else f"{b[k]} -> {r[k]}"
+                                          for k in keys}})
+    _report(f"compared with {compare}", diffs)
+
+# 在全新的直譯器裡跑 (不先 import bench.py 用到的 pandas 等)，冷啟動才量得準
+_STARTUP_CHILD = """
+import json, os, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t_import = time.perf_counter() - t0
+sys.path.insert(0, {repo!r})
+import tts
+tts.install_audio_cache(tts.AudioCache('audio', backend=lambda text, lang: b'ID3' + text.encode('utf-8')))
+at = AppTest.from_file(os.path.join({repo!r}, 'app.py'), default_timeout=3600)
+t1 = time.perf_counter()
+at.run()
+t_first = time.perf_counter() - t1
+cold = time.perf_counter() - t0
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+modules = len(sys.modules)
+import metrics  # app 已經載入過，這裡拿同一個模組
+
+def timed_run(action):
+    # AppTest 本身輪詢的時間不算，用 app 自己記的 rerun 時間 (TOEIC_PROFILE=1)
+    action()
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+    return next(iter(metrics._sessions.values()))['last']['rerun_ms'] / 1000
+
+p50 = lambda v: round(sorted(v)[len(v) // 2] * 1000, 2)
+first_script = next(iter(metrics._sessions.values()))['last']['rerun_ms']
+idle = [timed_run(at.run) for _ in range({rounds})]
+tabs = {{}}
+try:
+    nav = at.radio(key='active_tab')
+except KeyError:
+    nav = None  # 舊版 st.tabs: 每次 rerun 本來就全部跑
+if nav is not None:
+    for label in nav.options:
+        switch = timed_run(lambda: at.radio(key='active_tab').set_value(label).run())
+        tabs[label] = {{'switch_ms': round(switch * 1000, 2), 'rerun_p50_ms': p50([timed_run(at.run) for _ in range({rounds})])}}
+print(json.dumps({{'import_streamlit_ms': round(t_import * 1000, 1), 'first_run_ms': round(t_first * 1000, 1),
+                  'first_script_ms': first_script,
+                  'cold_start_ms': round(cold * 1000, 1), 'modules': modules, 'rerun_p50_ms': p50(idle), 'tabs': tabs}}))
+"""
+
+def bench_startup(sizes, rounds=20, compare=None):
+    # 冷啟動 (import + 第一次 rerun) 與之後每次 rerun 的時間；各分頁分開量。結果存成 JSON 方便跨 commit 比較
+    rows, tabs = [], []
+    for n in sizes:
+        cwd = os.getcwd()
+        work = _prepare_workdir(n)
+        env = dict(os.environ, TOEIC_PROFILE='1', TOEIC_PROFILE_FILE=os.path.join(work, 'profile.jsonl'))
+        out = subprocess.run([sys.executable, '-c', _STARTUP_CHILD.format(repo=REPO_DIR, rounds=rounds)],
+                             capture_output=True, text=True, cwd=work, env=env)
+        os.chdir(cwd)
+        if out.returncode != 0:
+            rows.append({'n': n, 'error': out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode})
+            continue
+        result = {'n': n, **json.loads(out.stdout.strip().splitlines()[-1])}
+        rows.append(result)
+        tabs.extend({'n': n, 'tab': label, **t} for label, t in result['tabs'].items())
+    _report("startup / rerun", [{k: v for k, v in r.items() if k != 'tabs'} for r in rows])
+    if tabs:
+        _report("per tab (switch + idle rerun)", tabs)
+
+    _save_and_compare('startup', rounds, rows, compare,
+                      ('cold_start_ms', 'first_run_ms', 'first_script_ms', 'rerun_p50_ms', 'modules'))
+
+def bench_apptest(sizes, rounds=20, compare=None):
+    # 每個大小開一個子行程跑，peak RSS 才不會互相污染；結果存成 JSON 方便跨 commit 比較
+    rows = []
+    for n in sizes:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '_apptest_one', '--sizes', str(n),
+                              '--rounds', str(rounds)], capture_output=True, text=True)
+        if out.returncode != 0:
+            rows.append({'n': n, 'error': out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode})
+            continue
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    _report("AppTest session (rerun latency / RSS / progress bytes)",
+            [{k: v for k, v in r.items() if k != 'by_action'} for r in rows])
+
+    _save_and_compare('apptest', rounds, rows, compare, ('cold_start_ms', 'p50_ms', 'p95_ms', 'peak_rss_mb', 'progress_bytes'))
+
+BENCHES = {
+    'answer': (bench_answer, [5_000, 50_000, 500_000]),
+    'distractor': (bench_distractor, [10_000, 100_000, 500_000]),
+    'search': (bench_search, [100_000]),
+    'apptest': (bench_apptest, [1_000, 10_000, 100_000, 1_000_000]),
+    'sessions': (bench_sessions, [100_000]),
+    'import': (bench_import, [100_000, 400_000]),
+    'round': (bench_round, [10_000, 100_000]),
+    'analytics': (bench_analytics, [10_000, 100_000]),
+    'prefetch': (bench_prefetch, [100_000]),
+    'audiopack': (bench_audiopack, [10_000, 100_000]),
+    'startup': (bench_startup, [1_000, 100_000]),
+    'sheets': (bench_sheets, [1_000, 100_000]),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bench', nargs='*', choices=[[]] + list(BENCHES) + ['_apptest_one'], default=[])
+    parser.add_argument('--sizes', nargs='+', type=int)
+    parser.add_argument('--rounds', type=int, default=20, help="apptest: 每個 session 跑幾輪；startup: 每頁 rerun 幾次")
+    parser.add_argument('--compare', help="apptest / startup: 跟之前存的結果 JSON 比較")
+    args = parser.parse_args()
+    if args.bench == ['_apptest_one']:
+        print(json.dumps(apptest_session(args.sizes[0], args.rounds)))
+        sys.exit(0)
+    for name in args.bench or [b for b in BENCHES if b not in ('apptest', 'sessions', 'round', 'prefetch', 'startup')]:
+        fn, default_sizes = BENCHES[name]
+        if name in ('apptest', 'startup'):
+            fn(args.sizes or default_sizes, args.rounds, args.compare)
+        else:
+            fn(args.sizes or default_sizes)
@@ -0,0 +1,258 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+from metrics import incr, span
+from vocab import CACHE_DIR, COMPILED_FILE, DATA_FILE, EXPECTED_COLS, file_key
+
+IMPORT_DIR = os.path.join(CACHE_DIR, "import")
+MANIFEST_FILE = os.path.join(IMPORT_DIR, "manifest.json")
+CHUNK_ROWS = 20000
+SOURCE_EXTS = ('.xlsx', '.xlsm', '.csv')
+
+# 匯入流程: 每個來源一列一列串流讀進來 → 正規化 → 用 set 去重 → 分批寫成該來源的 parquet 分片；
+# 再依來源順序把分片合併成 App 直接開的單字檔。只有 mtime / 大小變了的來源才會重讀
+
+def _iter_xlsx(path, chunk_size):
+    # openpyxl read_only 模式逐列讀，不會把整本活頁簿載進記憶體
+    import pandas as pd
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        batch = []
+        for row in rows:
+            batch.append(row[:len(header)])
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=header, dtype=object)
+                batch = []
+        if batch or not header:
+            yield pd.DataFrame(batch, columns=header, dtype=object)
+    finally:
+        wb.close()
+
+def _iter_csv(path, chunk_size):
+    import pandas as pd
+    yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8-sig')
+
+def iter_source(path, chunk_size=CHUNK_ROWS):
+    # 一批一批回傳原始欄位的 DataFrame
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return _iter_csv(path, chunk_size)
+    if ext in ('.xlsx', '.xlsm'):
+        return _iter_xlsx(path, chunk_size)
+    raise ValueError(f"不支援的檔案格式: {path}")
+
+def normalize_chunk(chunk):
+    # 跟 vocab.normalize_vocab 同樣的規則 (欄名小寫、缺的欄位補空字串、nan 變空字串)，另外去掉前後空白
+    import pandas as pd
+    chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+    out = {}
+    for col in EXPECTED_COLS:
+        if col in chunk.columns:
+            values = chunk[col]
+            out[col] = values.where(values.notna(), '').astype(str).str.strip().replace('nan', '')
+        else:
+            out[col] = ''
+    return pd.DataFrame(out, index=chunk.index)
+
+def _part_path(abspath):
+    name = os.path.splitext(os.path.basename(abspath))[0]
+    digest = hashlib.sha1(abspath.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(IMPORT_DIR, f"{name}-{digest}.parquet")
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([(col, pa.string()) for col in EXPECTED_COLS])
+
+def import_source(path, chunk_size=CHUNK_ROWS):
+    # 單一來源 → 分片 parquet；同一來源內重複的單字保留第一筆
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    key = file_key(path)
+    part = _part_path(key[0])
+    entry = {'path': key[0], 'key': list(key[1:]), 'part': part,
+             'rows': 0, 'kept': 0, 'duplicates': 0, 'empty': 0, 'missing_cols': []}
+    seen = set()
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    tmp_path = f"{part}.{os.getpid()}.tmp"
+    writer = None
+    try:
+        with span('import.source'):
+            for chunk in iter_source(path, chunk_size):
+                if writer is None:
+                    header = [str(c).strip().lower() for c in chunk.columns]
+                    if 'word' not in header:
+                        raise ValueError(f"{path}: 缺少 word 欄位 (需要 {', '.join(EXPECTED_COLS)})")
+                    entry['missing_cols'] = [c for c in EXPECTED_COLS if c not in header]
+                    writer = pq.ParquetWriter(tmp_path, _schema())
+                chunk = normalize_chunk(chunk)
+                entry['rows'] += len(chunk)
+                keep = []
+                for w in chunk['word'].tolist():
+                    fresh = bool(w) and w not in seen
+                    keep.append(fresh)
+                    if fresh:
+                        seen.add(w)
+                    elif w:
+                        entry['duplicates'] += 1
+                    else:
+                        entry['empty'] += 1
+                chunk = chunk[keep]
+                if len(chunk):
+                    entry['kept'] += len(chunk)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=_schema(), preserve_index=False))
+        if writer is None:
+            raise ValueError(f"{path}: 檔案是空的")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, part)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    incr('import.rows', entry['rows'])
+    return entry
+
+def _merge(entries, output):
+    # 依來源順序合併分片；跨來源重複的單字也是保留先出現的那筆
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    seen = set()
+    duplicates = 0
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    try:
+        with span('import.merge'), pq.ParquetWriter(tmp_path, _schema()) as writer:
+            for entry in entries:
+                for batch in pq.ParquetFile(entry['part']).iter_batches(batch_size=CHUNK_ROWS):
+                    words = batch.column(0).to_pylist()
+                    keep = []
+                    for w in words:
+                        fresh = w not in seen
+                        keep.append(fresh)
+                        if fresh:
+                            seen.add(w)
+                    duplicates += len(words) - sum(keep)
+                    writer.write_batch(batch.filter(pa.array(keep)) if not all(keep) else batch)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(seen), duplicates
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_FILE, encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(manifest):
+    tmp_path = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def expand_sources(paths):
+    # 目錄展開成裡面的 xlsx / csv (依檔名排序)；Office 的 ~$ 暫存檔略過
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(p for p in glob.glob(os.path.join(path, '*'))
+                           if p.lower().endswith(SOURCE_EXTS) and not os.path.basename(p).startswith('~$'))
+            sources.extend(found)
+        else:
+            sources.append(path)
+    return sources
+
+def compile_sources(sources, output=COMPILED_FILE, chunk_size=CHUNK_ROWS):
+    # 增量匯入: 沒變的來源直接沿用上次的分片；有任何變動才重新合併
+    manifest = _read_manifest()
+    previous = {e['path']: e for e in manifest.get('sources', [])}
+    entries, imported = [], []
+    for path in sources:
+        prev = previous.get(os.path.abspath(path))
+        if prev is not None and not os.path.exists(path) and os.path.exists(prev['part']):
+            # 來源被搬走 / 刪掉: 沿用上次匯入的分片，單字不會從單字檔消失
+            entries.append(prev)
+            continue
+        key = file_key(path)
+        if prev is not None and prev['key'] == list(key[1:]) and os.path.exists(prev['part']):
+            entries.append(prev)
+            continue
+        entries.append(import_source(path, chunk_size))
+        imported.append(key[0])
+
+    out_path = os.path.abspath(output)
+    unchanged = (not imported and manifest.get('output') == out_path and os.path.exists(out_path)
+                 and [e['path'] for e in entries] == [e['path'] for e in manifest.get('sources', [])])
+    if unchanged:
+        words, cross_dups = manifest['words'], manifest['cross_duplicates']
+    else:
+        words, cross_dups = _merge(entries, out_path)
+
+    live_parts = {e['part'] for e in entries}
+    for e in manifest.get('sources', []):
+        if e['part'] not in live_parts and os.path.exists(e['part']):
+            os.remove(e['part'])
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    _write_manifest({'output': out_path, 'words': words, 'cross_duplicates': cross_dups, 'sources': entries})
+    return {'output': out_path, 'words': words, 'cross_duplicates': cross_dups,
+            'imported': imported, 'rebuilt': not unchanged, 'sources': entries}
+
+_refresh_lock = threading.Lock()
+
+def _stale_sources(manifest):
+    # 上次匯入的來源裡還在、而且 mtime / 大小變了的
+    stale = []
+    for e in manifest.get('sources', []):
+        try:
+            key = file_key(e['path'])
+        except OSError:
+            continue  # 來源被搬走: 沿用上次匯入的內容
+        if list(key[1:]) != e['key']:
+            stale.append(e['path'])
+    return stale
+
+def refresh_compiled(output=COMPILED_FILE):
+    # App 每次 rerun 呼叫: 匯入過的來源 (例如 toeic_db.xlsx) 有改過就照同一份來源清單重新匯入。
+    # 沒變動只讀 manifest、stat 來源，不寫任何檔案；有重新匯入回傳 compile_sources 的結果，否則 None
+    out_path = os.path.abspath(output)
+    manifest = _read_manifest()
+    if manifest.get('output') != out_path or not os.path.exists(out_path) or not _stale_sources(manifest):
+        return None
+    with _refresh_lock:
+        # 同時好幾個 session 發現過期時只匯入一次
+        manifest = _read_manifest()
+        if not _stale_sources(manifest):
+            return None
+        sources = [e['path'] for e in manifest['sources']]
+        with span('import.refresh'):
+            return compile_sources(sources, output)
+
+if __name__ == "__main__":
+    # 例: python importer.py toeic_db.xlsx books/   (不給參數就匯入 toeic_db.xlsx)
+    parser = argparse.ArgumentParser(description="把多本單字 Excel / CSV 串流匯入成 App 用的單字檔")
+    parser.add_argument('sources', nargs='*', default=[DATA_FILE])
+    parser.add_argument('--output', default=COMPILED_FILE)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    sources = expand_sources(args.sources)
+    if not sources:
+        raise SystemExit("找不到任何 xlsx / csv 來源")
+    result = compile_sources(sources, args.output, args.chunk_rows)
+    for e in result['sources']:
+        status = '匯入' if e['path'] in result['imported'] else '未變動'
+        missing = f"，缺少欄位 {', '.join(e['missing_cols'])}" if e['missing_cols'] else ''
+        print(f"[{status}] {e['path']}: {e['rows']} 列，保留 {e['kept']}，重複 {e['duplicates']}，"
+              f"空白 {e['empty']}{missing}")
+    print(f"共 {result['words']} 個單字 (跨檔重複 {result['cross_duplicates']}) → {result['output']}"
+          + ("" if result['rebuilt'] else " (沒有變動)"))
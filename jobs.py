@@ -0,0 +1,82 @@
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class JobQueue:
+    # 作答後的副作用 (存進度、合成回饋語音) 丟到背景執行，畫面不用等。
+    # 工作不綁 session: 關掉瀏覽器不會等也不會取消，只有行程結束時 (atexit 的 shutdown) 才會等佇列清空
+    def __init__(self, name, workers=1):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"toeic-{name}")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.depth = 0
+        self.done = 0
+        self.failed = 0
+        self.last_error = None
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def _run(self, enqueued_at, fn, args, kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self.last_error = repr(e)
+            raise
+        finally:
+            latency = time.perf_counter() - enqueued_at
+            with self._lock:
+                self.depth -= 1
+                self.done += 1
+                self._latency_sum += latency
+                self._latency_max = max(self._latency_max, latency)
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self.depth += 1
+        fut = self._executor.submit(self._run, time.perf_counter(), fn, args, kwargs)
+        with self._lock:
+            self._pending.add(fut)
+        fut.add_done_callback(self._forget)
+        return fut
+
+    def _forget(self, fut):
+        with self._lock:
+            self._pending.discard(fut)
+
+    def flush(self, timeout=None):
+        # 等目前排進來的工作都做完 (量測 / 測試用)
+        with self._lock:
+            futs = list(self._pending)
+        if futs:
+            wait(futs, timeout=timeout)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'depth': self.depth,
+                'done': self.done,
+                'failed': self.failed,
+                'avg_ms': round(self._latency_sum / self.done * 1000, 1) if self.done else 0.0,
+                'max_ms': round(self._latency_max * 1000, 1),
+                'last_error': self.last_error,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+# 存進度只用 1 個 worker，確保同一個字的寫入順序不會亂
+_queues = {}
+_queues_lock = threading.Lock()
+_WORKERS = {'persist': 1, 'audio': 4, 'prefetch': 4}
+
+def get_job_queue(name):
+    with _queues_lock:
+        if name not in _queues:
+            q = JobQueue(name, _WORKERS.get(name, 1))
+            atexit.register(q.shutdown)
+            _queues[name] = q
+        return _queues[name]
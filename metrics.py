@@ -0,0 +1,129 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+# TOEIC_PROFILE=1 才會記錄；關閉時 span / timed / incr 幾乎沒有成本
+ENABLED = os.environ.get("TOEIC_PROFILE", "") not in ("", "0")
+EXPORT_FILE = os.environ.get("TOEIC_PROFILE_FILE", os.path.join(".toeic_cache", "profile.jsonl"))
+HIST_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+counters = Counter()
+totals = {}  # span 名稱 -> [次數, 總秒數, 最長秒數]
+_sessions = {}
+_lock = threading.Lock()
+_local = threading.local()
+_NOOP = nullcontext()
+
+def _record(name, dt):
+    with _lock:
+        t = totals.get(name)
+        if t is None:
+            totals[name] = [1, dt, dt]
+        else:
+            t[0] += 1
+            t[1] += dt
+            t[2] = max(t[2], dt)
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['spans'].append((name, dt))
+        run['last_end'] = time.perf_counter()
+
+class _Span:
+    __slots__ = ('name', 't0')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.t0)
+        return False
+
+def span(name):
+    return _Span(name) if ENABLED else _NOOP
+
+def timed(name):
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def incr(name, n=1):
+    if ENABLED:
+        with _lock:
+            counters[name] += n
+
+def _finish(session_id, run, interrupted):
+    elapsed = run['last_end'] - run['t0']
+    state = _sessions[session_id]
+    bucket = next((i for i, b in enumerate(HIST_BUCKETS_MS) if elapsed * 1000 <= b), len(HIST_BUCKETS_MS))
+    state['hist'][bucket] += 1
+    state['runs'] += 1
+    record = {
+        'ts': round(run['wall'], 3),
+        'session': session_id,
+        'rerun_ms': round(elapsed * 1000, 2),
+        'interrupted': interrupted,
+        'spans': [[name, round(dt * 1000, 3)] for name, dt in run['spans']],
+    }
+    state['last'] = record
+    _export(record)
+
+def _export(record):
+    try:
+        os.makedirs(os.path.dirname(EXPORT_FILE) or '.', exist_ok=True)
+        with open(EXPORT_FILE, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except OSError:
+        pass
+
+def begin_rerun(session_id):
+    if not ENABLED:
+        return
+    with _lock:
+        state = _sessions.setdefault(session_id, {'open': None, 'hist': [0] * (len(HIST_BUCKETS_MS) + 1),
+                                                  'runs': 0, 'last': None})
+        prev = state['open']
+        now = time.perf_counter()
+        state['open'] = {'t0': now, 'last_end': now, 'wall': time.time(), 'spans': []}
+        _local.run = state['open']
+        # 上一輪被 st.rerun / st.stop 中斷時，算到最後一個 span 結束為止
+        if prev is not None:
+            _finish(session_id, prev, interrupted=True)
+
+def end_rerun(session_id):
+    if not ENABLED:
+        return
+    with _lock:
+        state = _sessions.get(session_id)
+        run = state and state['open']
+        if not run:
+            return
+        run['last_end'] = time.perf_counter()
+        state['open'] = None
+        _local.run = None
+        _finish(session_id, run, interrupted=False)
+
+def snapshot(session_id=None):
+    with _lock:
+        state = _sessions.get(session_id, {})
+        labels = [f"<={b}ms" for b in HIST_BUCKETS_MS] + [f">{HIST_BUCKETS_MS[-1]}ms"]
+        return {
+            'last_rerun': state.get('last'),
+            'rerun_histogram': dict(zip(labels, state.get('hist', []))),
+            'counters': dict(counters),
+            'spans': {name: {'count': c, 'avg_ms': round(s / c * 1000, 2), 'max_ms': round(m * 1000, 2)}
+                      for name, (c, s, m) in sorted(totals.items())},
+        }
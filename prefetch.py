@@ -0,0 +1,85 @@
+import os
+import random
+import threading
+from collections import deque
+from metrics import incr
+
+# 每種題型先準備幾題；TOEIC_PREFETCH=0 關閉 (每題都當場抽)
+PREFETCH_SIZE = int(os.environ.get("TOEIC_PREFETCH", "3"))
+
+def question_maker(df_vocab, positions, distractors=None, hard_mode=False):
+    # 從 positions 抽一題；有 distractors 就連選項一起產生。只讀共用的單字表，背景執行緒可以直接呼叫
+    words, meanings, types = df_vocab['word'], df_vocab['meaning'], df_vocab['type']
+
+    def make(rng):
+        pos = int(positions[rng.randrange(len(positions))])
+        item = {'pos': pos, 'word': str(words.iat[pos])}
+        if distractors is not None:
+            bucket = ('type', types.iat[pos]) if hard_mode else None
+            item['options'] = distractors.options(meanings.iat[pos], bucket=bucket, rng=rng)
+        return item
+    return make
+
+class QuestionBuffer:
+    # 每個 session、每種題型一份: 接下來 K 題 (列位置、選項) 在背景抽好，語音也先合成好才放進來，
+    # 作答後下一題直接拿，rerun 裡不用抽題也不用等 TTS。範圍 (key) 變了就整批作廢
+    def __init__(self, size=None):
+        self.size = PREFETCH_SIZE if size is None else size
+        self.key = None
+        self._make = None
+        self._warm = None
+        self._items = deque()
+        self._inflight = 0
+        self._generation = 0
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def configure(self, key, make, warm=None):
+        # make(rng) -> 一題；warm(題目) 準備好語音。舊範圍還在背景做的題目做完會被丟掉
+        with self._lock:
+            self._make, self._warm = make, warm
+            if key != self.key:
+                self.key = key
+                self._items.clear()
+                self._inflight = 0
+                self._generation += 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def _fill(self, generation, make, warm):
+        item = None
+        try:
+            item = make(self._rng)
+            if warm is not None:
+                warm(item)  # 合成失敗還是出這題，播放時再當場合成
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._inflight -= 1
+                    if item is not None:
+                        self._items.append(item)
+
+    def refill(self, jobs):
+        # 一題一個工作，語音可以平行合成
+        with self._lock:
+            need = self.size - len(self._items) - self._inflight
+            if need <= 0 or self._make is None:
+                return
+            self._inflight += need
+            args = (self._generation, self._make, self._warm)
+        for _ in range(need):
+            jobs.submit(self._fill, *args)
+
+    def take(self, jobs):
+        # 有準備好的就直接用；沒有 (剛開 session、剛換範圍、答得比背景快) 才當場抽
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+            make = self._make
+        if item is None:
+            incr('prefetch.miss')
+            item = make(self._rng)
+        else:
+            incr('prefetch.hit')
+        self.refill(jobs)
+        return item
@@ -0,0 +1,589 @@
+import csv
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+import atexit
+import weakref
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from metrics import incr, span
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只靠行程內的 lock
+    fcntl = None
+
+PROGRESS_FILE = "user_progress.csv"
+JOURNAL_FILE = "user_progress.journal"
+DB_FILE = "user_progress.db"
+EVENTS_FILE = "review_events.bin"
+# journal: 單機單人 (預設)；sqlite: 教室多人，各自用使用者 ID 存進度
+PROGRESS_BACKEND = os.environ.get("TOEIC_PROGRESS_BACKEND", "journal")
+PROGRESS_COLS = ['word', 'level', 'last_review_date']
+JOURNAL_COLS = PROGRESS_COLS + ['ts']
+# 作答事件: 日期 (ordinal)、使用者 / 單字 id、作答前後 level、距上次複習天數 (-1 = 沒複習過)、是否第一次出現在紀錄裡
+EVENT_DTYPE = np.dtype([('day', '<i4'), ('user', '<u4'), ('word', '<u4'), ('old', 'i1'), ('new', 'i1'),
+                        ('gap', '<i2'), ('first', '?')])
+
+class SessionProgress:
+    # 每個 session 只記自己複習過的字 (列位置 -> level / 日期)，單字內容本身共用唯讀的單字表
+    def __init__(self):
+        self.levels = {}
+        self.dates = {}
+
+    @classmethod
+    def from_frame(cls, df_prog, word_index):
+        progress = cls()
+        if df_prog is None:
+            return progress
+        for word, level, last in zip(df_prog['word'].tolist(), df_prog['level'].tolist(),
+                                     df_prog['last_review_date'].tolist()):
+            pos = word_index.get(word)
+            if pos is None:
+                continue
+            level = 1 if pd.isna(level) else int(level)
+            last = '' if pd.isna(last) else str(last)
+            if level != 1:
+                progress.levels[pos] = level
+            if last:
+                progress.dates[pos] = last
+        return progress
+
+    def level(self, pos):
+        return self.levels.get(pos, 1)
+
+    def date(self, pos):
+        return self.dates.get(pos, '')
+
+    def update(self, pos, level, last_review_date):
+        if level == 1:
+            self.levels.pop(pos, None)
+        else:
+            self.levels[pos] = level
+        self.dates[pos] = last_review_date
+
+    def update_many(self, positions, levels, last_review_date):
+        # 回合模式整批寫回: 同一天、各自的新 level
+        for pos, level in zip(positions, levels):
+            if level == 1:
+                self.levels.pop(pos, None)
+            else:
+                self.levels[pos] = level
+        self.dates.update(dict.fromkeys(positions, last_review_date))
+
+    def levels_for(self, positions):
+        return [self.levels.get(p, 1) for p in positions]
+
+    def dates_for(self, positions):
+        return [self.dates.get(p, '') for p in positions]
+
+def _lock_file(fh):
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+
+def _unlock_file(fh):
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+class ProgressJournal:
+    # 每次作答只 append 一行到 journal (O(1))，快照 CSV 由壓縮步驟合併重寫
+    def __init__(self, snapshot_path=PROGRESS_FILE, journal_path=JOURNAL_FILE,
+                 fsync_every=20, fsync_interval=2.0, compact_bytes=256 * 1024):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._fh = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compacting = False
+        self._stop = threading.Event()
+        self._syncer = None
+        self.bytes_written = 0  # journal 追加 + 快照重寫實際寫出的位元組數
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.journal_path, 'a', newline='', encoding='utf-8')
+            if self._syncer is None:
+                # 最後幾筆作答之後沒有新的寫入也要在 fsync_interval 內落盤
+                self._stop.clear()
+                self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+                self._syncer.start()
+        return self._fh
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                if self._fh is not None and self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, word, level, last_review_date):
+        self.record_many([(word, level, last_review_date)])
+
+    def record_many(self, rows):
+        # rows: [(word, level, last_review_date), ...]；一整批只 lock / flush 一次
+        ts = f"{time.time():.3f}"
+        lines = [[word, int(level), last_review_date, ts] for word, level, last_review_date in rows]
+        if not lines:
+            return
+        with self._lock:
+            fh = self._open()
+            _lock_file(fh)
+            try:
+                buf = io.StringIO()
+                csv.writer(buf).writerows(lines)
+                data = buf.getvalue()
+                fh.write(data)
+                fh.flush()
+                incr('progress.journal_append', len(lines))
+            finally:
+                _unlock_file(fh)
+            written = len(data.encode('utf-8'))
+            self.bytes_written += written
+            incr('progress.bytes_written', written)
+            self._unsynced += len(lines)
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+                self._fsync()
+            need_compact = os.fstat(fh.fileno()).st_size >= self.compact_bytes and not self._compacting
+            if need_compact:
+                self._compacting = True
+        if need_compact:
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            return None
+        # 寫到一半的最後一行直接略過
+        return pd.read_csv(self.journal_path, names=JOURNAL_COLS, header=None,
+                           dtype={'word': str, 'last_review_date': str}, on_bad_lines='skip')
+
+    def load(self):
+        frames = []
+        if os.path.exists(self.snapshot_path):
+            frames.append(pd.read_csv(self.snapshot_path, dtype={'word': str}))
+        df_journal = self._read_journal()
+        if df_journal is not None:
+            frames.append(df_journal)
+        if not frames:
+            return None
+        df_prog = pd.concat(frames, ignore_index=True)
+        if 'last_review_date' not in df_prog.columns:
+            df_prog['last_review_date'] = ''
+        df_prog = df_prog.dropna(subset=['word', 'level'])
+        return df_prog.drop_duplicates(subset=['word'], keep='last')[PROGRESS_COLS]
+
+    def compact(self):
+        # 把 journal 併進快照 CSV，再把 journal 截斷；期間擋住其他行程的 append
+        with open(self.journal_path, 'a', encoding='utf-8') as lock_fh, span('progress.compact'):
+            _lock_file(lock_fh)
+            try:
+                df_prog = self.load()
+                if df_prog is None:
+                    return
+                df_prog['level'] = df_prog['level'].astype(int)
+                tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+                df_prog.to_csv(tmp_path, index=False)
+                written = os.path.getsize(tmp_path)
+                with self._lock:
+                    self.bytes_written += written
+                incr('progress.csv_write')
+                incr('progress.bytes_written', written)
+                os.replace(tmp_path, self.snapshot_path)
+                os.truncate(self.journal_path, 0)
+            finally:
+                _unlock_file(lock_fh)
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception:
+            pass
+        finally:
+            self._compacting = False
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._syncer = None
+            if self._fh is not None:
+                self._fh.flush()
+                self._fsync()
+                self._fh.close()
+                self._fh = None
+
+# 同一個行程內所有 session 共用同一個 journal (同一把 lock)
+_journals = {}
+_journals_lock = threading.Lock()
+
+def get_journal(snapshot_path=PROGRESS_FILE, journal_path=JOURNAL_FILE):
+    key = (os.path.abspath(snapshot_path), os.path.abspath(journal_path))
+    with _journals_lock:
+        if key not in _journals:
+            journal = ProgressJournal(snapshot_path, journal_path)
+            atexit.register(journal.close)
+            _journals[key] = journal
+        return _journals[key]
+
+# --- SQLite 多人進度 ---
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    last_review_date TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, word)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_progress_updated ON progress (updated_at);
+CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+_UPSERT = """
+INSERT INTO progress (user_id, word, level, last_review_date, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id, word) DO UPDATE SET
+    level = excluded.level, last_review_date = excluded.last_review_date, updated_at = excluded.updated_at
+"""
+
+class ProgressDB:
+    # 一個行程共用: 連線池 + 寫入緩衝，達到 batch_size 或每 flush_interval 秒用 executemany 一次寫入
+    def __init__(self, db_path=DB_FILE, pool_size=4, batch_size=50, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(None)
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(_SCHEMA)
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True)
+        self._flusher.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def record(self, user_id, word, level, last_review_date):
+        self.record_many(user_id, [(word, level, last_review_date)])
+
+    def record_many(self, user_id, rows):
+        with self._pending_lock:
+            self._pending.extend((user_id, word, int(level), last_review_date or '')
+                                 for word, level, last_review_date in rows)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if rows:
+                with self.connection() as conn, span('progress.sqlite_flush'):
+                    with conn:
+                        # updated_at 在寫入的交易裡才蓋，而且一定比表裡已有的新 (跨行程也是)；
+                        # SheetsSync 拿它當水位，先蓋章、晚寫入的列才不會落在水位後面被跳過
+                        conn.execute("BEGIN IMMEDIATE")
+                        last = conn.execute("SELECT MAX(updated_at) FROM progress").fetchone()[0] or 0.0
+                        now = max(time.time(), last + 1e-6)
+                        conn.executemany(_UPSERT, [row + (now,) for row in rows])
+                incr('progress.sqlite_upsert', len(rows))
+
+    def _flush_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+
+    def load(self, user_id):
+        self.flush()
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT word, level, last_review_date FROM progress WHERE user_id = ?", (user_id,)).fetchall()
+        if not rows:
+            return None
+        return pd.DataFrame(rows, columns=PROGRESS_COLS)
+
+    def changed_since(self, since):
+        self.flush()
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT user_id, word, level, last_review_date, updated_at FROM progress "
+                "WHERE updated_at > ? ORDER BY updated_at", (since,)).fetchall()
+
+    def get_state(self, name, default=0.0):
+        with self.connection() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, name, value):
+        with self.connection() as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, value))
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+class UserProgressStore:
+    # 跟 ProgressJournal 一樣的 load / record 介面，只是綁定一個使用者
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+
+    def load(self):
+        return self.db.load(self.user_id)
+
+    def record(self, word, level, last_review_date):
+        self.db.record(self.user_id, word, level, last_review_date)
+
+    def record_many(self, rows):
+        self.db.record_many(self.user_id, rows)
+
+class SheetsSync:
+    # 背景定期把 SQLite 的新進度整批 append 到 Google Sheets，不佔用作答的 request
+    # worksheet 只要有 append_rows(rows) 即可 (gspread Worksheet 或測試用的假物件)
+    def __init__(self, db, worksheet, interval=60.0, state_name='sheets_synced_at'):
+        self.db = db
+        self.worksheet = worksheet
+        self.interval = interval
+        self.state_name = state_name
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync_once(self):
+        since = self.db.get_state(self.state_name)
+        rows = self.db.changed_since(since)
+        if not rows:
+            return 0
+        self.worksheet.append_rows([list(r) for r in rows])
+        self.db.set_state(self.state_name, rows[-1][4])
+        return len(rows)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.sync_once()
+        except Exception as e:
+            self.last_error = e
+
+def gspread_worksheet(credentials_file, sheet_name, worksheet=0):
+    # requirements.txt 裡的 gspread / oauth2client，用到才 import
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_file, scope)
+    return gspread.authorize(creds).open(sheet_name).get_worksheet(worksheet)
+
+_dbs = {}
+
+def get_db(db_path=DB_FILE):
+    key = os.path.abspath(db_path)
+    with _journals_lock:
+        if key not in _dbs:
+            db = ProgressDB(db_path)
+            atexit.register(db.close)
+            sheet_name = os.environ.get("TOEIC_GSHEET")
+            if sheet_name:
+                creds = os.environ.get("TOEIC_GSHEET_CREDENTIALS", "credentials.json")
+                sync = SheetsSync(db, gspread_worksheet(creds, sheet_name)).start()
+                atexit.register(sync.stop)
+            _dbs[key] = db
+        return _dbs[key]
+
+class ReviewLog:
+    # 作答紀錄只 append 不改寫: 檔案裡每筆是固定長度的二進位紀錄 (np.fromfile 直接讀)，
+    # 讀進記憶體後每個欄位各一個陣列 (columnar)，統計時不用再跨欄位跳著讀；
+    # 單字 / 使用者字串另外存成字典檔 (行號就是 id)。讀的時候只讀上次之後新增的尾巴
+    def __init__(self, path=EVENTS_FILE):
+        self.path = path
+        self.words_path = f"{path}.words"
+        self.users_path = f"{path}.users"
+        self._lock = threading.Lock()
+        self._cols = {name: np.empty(1024, EVENT_DTYPE[name]) for name in EVENT_DTYPE.names}
+        self._n = 0
+        self._offsets = {self.path: 0, self.words_path: 0, self.users_path: 0}
+        self.words, self._word_ids = [], {}
+        self.users, self._user_ids = [], {}
+        self._seen = {}  # 使用者 id -> 單字 id 的 bool 陣列 (有沒有出現過)；寫入時才需要，寫到哪個使用者才建
+        self._listeners = []  # weakref: 新紀錄進來就通知 (例如全班統計的累計量)，跟著寫入的執行緒跑
+
+    def _read_lines(self, path, names, ids):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as fh:
+            fh.seek(self._offsets[path])
+            data = fh.read()
+        end = data.rfind(b'\n') + 1  # 寫到一半的最後一行下次再讀
+        for name in data[:end].decode('utf-8').split('\n')[:-1]:
+            ids[name] = len(names)
+            names.append(name)
+        self._offsets[path] += end
+
+    def _append(self, records):
+        need = self._n + len(records)
+        for name, col in self._cols.items():
+            if need > len(col):
+                grown = np.empty(max(need, 2 * len(col)), col.dtype)
+                grown[:self._n] = col[:self._n]
+                self._cols[name] = col = grown
+            col[self._n:need] = records[name]
+        self._n = need
+        for user in list(self._seen):
+            words = records['word'][records['user'] == user]
+            if len(words):
+                self._seen_for(user)[words] = True
+        self._notify()
+
+    def _notify(self):
+        alive = []
+        for ref in self._listeners:
+            fn = ref()
+            if fn is not None:
+                fn(self.columns(), self.words, self._user_ids)
+                alive.append(ref)
+        self._listeners = alive
+
+    def subscribe(self, fn):
+        # fn(欄位, 單字字典, 使用者 id 對照) 在拿著 log 的 lock 時呼叫: 訂閱時先用目前全部紀錄呼叫一次，
+        # 之後每次 append (本行程寫入或補讀別的行程) 都再呼叫；fn 是 bound method，物件被回收就自動退訂
+        with self._lock:
+            self._refresh()
+            self._listeners.append(weakref.WeakMethod(fn))
+            fn(self.columns(), self.words, self._user_ids)
+
+    def _seen_for(self, user):
+        # 一個使用者一個 bitmap (每個單字 1 byte)，第一次用時從既有紀錄向量化建出來；單字字典變大就跟著長
+        seen = self._seen.get(user)
+        if seen is None:
+            seen = np.zeros(len(self.words), dtype=bool)
+            cols = self.columns()
+            seen[cols['word'][cols['user'] == user]] = True
+            self._seen[user] = seen
+        elif len(seen) < len(self.words):
+            grown = np.zeros(max(len(self.words), 2 * len(seen)), dtype=bool)
+            grown[:len(seen)] = seen
+            self._seen[user] = seen = grown
+        return seen
+
+    def _refresh(self):
+        # 別的行程寫進來的部分 (以及第一次載入) 從檔案尾巴補讀
+        self._read_lines(self.words_path, self.words, self._word_ids)
+        self._read_lines(self.users_path, self.users, self._user_ids)
+        if not os.path.exists(self.path):
+            return
+        count = (os.path.getsize(self.path) - self._offsets[self.path]) // EVENT_DTYPE.itemsize
+        if count > 0:
+            with span('progress.events_load'):
+                records = np.fromfile(self.path, EVENT_DTYPE, count=count, offset=self._offsets[self.path])
+            self._offsets[self.path] += count * EVENT_DTYPE.itemsize
+            self._append(records)
+
+    def _intern(self, name, names, ids, path):
+        i = ids.get(name)
+        if i is None:
+            with open(path, 'ab') as fh:
+                _lock_file(fh)
+                try:
+                    fh.write(name.replace('\n', ' ').encode('utf-8') + b'\n')
+                finally:
+                    _unlock_file(fh)
+            self._offsets[path] = os.path.getsize(path)
+            i = ids[name] = len(names)
+            names.append(name)
+        return i
+
+    def record(self, user_id, rows):
+        # rows: [(word, old_level, new_level, gap_days, day_ordinal), ...]
+        if not rows:
+            return
+        with self._lock, open(self.path, 'ab') as fh:
+            # 拿著檔案鎖先補讀別人寫的尾巴再寫，offset 才會跟檔案對齊
+            _lock_file(fh)
+            try:
+                self._refresh()
+                user = self._intern(str(user_id), self.users, self._user_ids, self.users_path)
+                word_ids = [self._intern(str(row[0]), self.words, self._word_ids, self.words_path) for row in rows]
+                seen = self._seen_for(user)
+                records = np.empty(len(rows), EVENT_DTYPE)
+                for i, (word_id, (_, old, new, gap, day)) in enumerate(zip(word_ids, rows)):
+                    records[i] = (day, user, word_id, old, new, max(-1, min(gap, 32767)), not seen[word_id])
+                    seen[word_id] = True
+                fh.write(records.tobytes())
+                fh.flush()
+                self._offsets[self.path] += len(records) * EVENT_DTYPE.itemsize
+                self._append(records)
+            finally:
+                _unlock_file(fh)
+        incr('progress.events_append', len(rows))
+
+    def snapshot(self):
+        # (欄位名 -> 唯讀陣列, 單字字典, 使用者 id 對照)；之後 append 的紀錄不會出現在這些 view 裡
+        with self._lock:
+            self._refresh()
+            return self.columns(), self.words, dict(self._user_ids)
+
+    def columns(self):
+        events = {}
+        for name, col in self._cols.items():
+            view = col[:self._n]
+            view.flags.writeable = False
+            events[name] = view
+        return events
+
+_logs = {}
+
+def get_review_log(path=EVENTS_FILE):
+    key = os.path.abspath(path)
+    with _journals_lock:
+        if key not in _logs:
+            _logs[key] = ReviewLog(path)
+        return _logs[key]
+
+def get_progress_store(user_id=None):
+    if PROGRESS_BACKEND == "sqlite":
+        return UserProgressStore(get_db(), user_id or "default")
+    return get_journal()
@@ -0,0 +1,53 @@
+import random
+
+class DistractorIndex:
+    # 每版單字表建一次: 去重後的意思陣列 + 反查表，出題時用拒絕取樣，跟單字量無關
+    def __init__(self, df_vocab, bucket_cols=('type', 'week')):
+        self.meanings = []
+        self.meaning_ids = {}
+        for m in df_vocab['meaning'].tolist():
+            if m and m not in self.meaning_ids:
+                self.meaning_ids[m] = len(self.meanings)
+                self.meanings.append(m)
+
+        # 困難模式: 同一分類 / 週次裡出現過的意思
+        self.buckets = {}
+        for col in bucket_cols:
+            if col not in df_vocab.columns:
+                continue
+            groups = {}
+            for val, m in zip(df_vocab[col].tolist(), df_vocab['meaning'].tolist()):
+                if m:
+                    groups.setdefault(val, {})[self.meaning_ids[m]] = None
+            self.buckets[col] = {val: list(ids) for val, ids in groups.items()}
+
+    def _pick(self, pool, correct_id, k, rng):
+        # pool 裡的 id 互不重複，最多只有一個是正解，所以 n > k 時一定取得完
+        n = len(pool)
+        if n < k or (n == k and correct_id in pool):
+            return None
+        picked = {}
+        while len(picked) < k:
+            i = pool[rng.randrange(n)]
+            if i != correct_id:
+                picked[i] = None
+        return list(picked)
+
+    def sample(self, correct, k=3, bucket=None, rng=random):
+        correct_id = self.meaning_ids.get(correct, -1)
+        ids = None
+        if bucket is not None:
+            col, val = bucket
+            pool = self.buckets.get(col, {}).get(val)
+            if pool:
+                ids = self._pick(pool, correct_id, k, rng)
+        if ids is None:
+            ids = self._pick(range(len(self.meanings)), correct_id, k, rng)
+        if ids is None:
+            ids = [i for i in range(len(self.meanings)) if i != correct_id][:k]
+        return [self.meanings[i] for i in ids]
+
+    def options(self, correct, k=3, bucket=None, rng=random):
+        opts = self.sample(correct, k, bucket, rng) + [correct]
+        rng.shuffle(opts)
+        return opts
@@ -0,0 +1,61 @@
+import os
+import random
+import numpy as np
+from metrics import span
+
+ROUND_SIZE = 20
+ROUND_KINDS = ('flashcard', 'quiz')
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "round")
+CARD_COLS = ['word', 'phonetic', 'meaning', 'sentence', 'sentence_cn', 'type']
+
+# 回合模式: 一次把 N 題 (含選項、語音網址) 送到瀏覽器，在前端作答，最後整批送回來只 rerun 一次
+_component = None
+
+def round_player(payload, key):
+    # custom component 用到才宣告，平常的 rerun 不用多付成本
+    global _component
+    if _component is None:
+        import streamlit.components.v1 as components
+        _component = components.declare_component("toeic_round", path=COMPONENT_DIR)
+    return _component(round=payload, key=key, default=None)
+
+def build_round(round_id, kind, df_vocab, positions, distractors=None, hard_mode=False,
+                audio_url=None, rng=random):
+    # positions: 這一回合要出的列位置 (不重複)；單字表只 take 一次，其餘都是 list 操作
+    with span('round.build'):
+        positions = [int(p) for p in positions]
+        cols = df_vocab.iloc[positions][CARD_COLS]
+        rows = {c: [('' if v is None else str(v)) for v in cols[c].tolist()] for c in CARD_COLS}
+        items = []
+        for i, pos in enumerate(positions):
+            item = {'pos': pos, **{c: rows[c][i] for c in CARD_COLS}}
+            if kind == 'quiz':
+                bucket = ('type', cols['type'].iat[i]) if hard_mode else None
+                item['options'] = distractors.options(item['meaning'], bucket=bucket, rng=rng)
+            if audio_url is not None:
+                item['audio'] = audio_url(item['word'])
+            items.append(item)
+    return {'id': round_id, 'kind': kind, 'items': items}
+
+def grade_round(payload, answers):
+    # answers: [[題號, 作答], ...]；閃卡的作答是 1 (記得) / 0 (陌生)，擂台是選到的選項編號
+    # 擂台的對錯在這裡用伺服器留的題目判斷，不相信前端
+    items = payload['items']
+    seen = {}
+    for idx, value in answers or ():
+        if isinstance(idx, int) and 0 <= idx < len(items) and idx not in seen:
+            seen[idx] = value
+    idx = list(seen)
+    positions = np.array([items[i]['pos'] for i in idx], dtype=np.int64)
+    if payload['kind'] == 'quiz':
+        correct = np.array([isinstance(v, int) and 0 <= v < len(items[i]['options'])
+                            and items[i]['options'][v] == items[i]['meaning'] for i, v in seen.items()], dtype=bool)
+    else:
+        correct = np.array([bool(v) for v in seen.values()], dtype=bool)
+    unanswered = [items[i]['pos'] for i in range(len(items)) if i not in seen]
+    return positions, correct, unanswered
+
+def next_levels(levels, correct):
+    # 跟單題作答同一套規則: 答對升一級 (最多 4)，答錯回到 1
+    levels = np.asarray(levels, dtype=np.int64)
+    return np.where(correct, np.minimum(levels + 1, 4), 1)
@@ -0,0 +1,99 @@
+import datetime
+import heapq
+import itertools
+import numpy as np
+
+# Leitner 間隔 (天): level 1 當天再複習，level 4 一週後
+INTERVAL_DAYS = {1: 0, 2: 1, 3: 3, 4: 7}
+
+def due_ordinal(level, last_review_date, today=None):
+    today = today or datetime.date.today()
+    if not last_review_date:
+        return today.toordinal()  # 沒複習過的新卡片當天到期
+    try:
+        last = datetime.date.fromisoformat(str(last_review_date)[:10])
+    except ValueError:
+        return today.toordinal()
+    return last.toordinal() + INTERVAL_DAYS.get(int(level), 0)
+
+def days_since(last_review_date, today=None):
+    # 距上次複習幾天；沒複習過 (或日期壞掉) 回傳 -1
+    if not last_review_date:
+        return -1
+    try:
+        last = datetime.date.fromisoformat(str(last_review_date)[:10])
+    except ValueError:
+        return -1
+    return max(0, (today or datetime.date.today()).toordinal() - last.toordinal())
+
+class DueQueue:
+    # 最早到期的卡片在最上面；作答後只 push 一筆新的，舊的那筆 pop 時再丟掉 (lazy invalidation)
+    # 沒複習過的卡片不進 heap: 它們都是今天到期、照範圍順序出，用游標依序取，每個 session 只存複習過的字
+    def __init__(self, positions, levels, last_review_dates, today=None):
+        today = today or datetime.date.today()
+        self._today = today.toordinal()
+        self._positions = np.asarray(positions)  # 由小到大排好的列位置，可以是共用的唯讀陣列
+        self._cursor = 0
+        self._seq = itertools.count(len(self._positions))
+        self._due = {}
+        self._live = {}
+        self._heap = []
+        for i, (pos, lvl, last) in enumerate(zip(self._positions.tolist(), levels, last_review_dates)):
+            if last:
+                due = due_ordinal(lvl, last, today)
+                self._due[pos] = due
+                self._live[pos] = i
+                self._heap.append((due, i, pos))
+        heapq.heapify(self._heap)
+        self._unseen = len(self._positions) - len(self._due)
+
+    def __len__(self):
+        return len(self._live) + self._unseen
+
+    def _index(self, pos):
+        i = int(np.searchsorted(self._positions, pos))
+        return i if i < len(self._positions) and self._positions[i] == pos else None
+
+    def _next_unseen(self):
+        while self._cursor < len(self._positions):
+            pos = int(self._positions[self._cursor])
+            if pos not in self._due:
+                return self._cursor, pos
+            self._cursor += 1
+        return None
+
+    def _push(self, pos, due):
+        if pos not in self._due:
+            self._unseen -= 1
+        seq = next(self._seq)
+        self._due[pos] = due
+        self._live[pos] = seq
+        heapq.heappush(self._heap, (due, seq, pos))
+        if len(self._heap) > 2 * len(self._live) + 32:
+            self._heap = [(self._due[p], s, p) for p, s in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def pop(self):
+        while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        unseen = self._next_unseen()
+        if unseen is not None and (not self._heap or (self._today, unseen[0]) < self._heap[0][:2]):
+            self._cursor += 1
+            self._unseen -= 1
+            self._due[unseen[1]] = self._today
+            return unseen[1]
+        if self._heap:
+            due, seq, pos = heapq.heappop(self._heap)
+            del self._live[pos]
+            return pos
+        return None
+
+    def schedule(self, pos, level, last_review_date):
+        # 作答後依新的 level 重新排程；不在這個範圍的單字就略過
+        if self._index(pos) is not None:
+            self._push(pos, due_ordinal(level, last_review_date))
+
+    def requeue(self, pos):
+        # 沒作答就跳過: 排到今天的隊伍最後面
+        if pos in self._due and pos not in self._live:
+            self._push(pos, max(self._due[pos], datetime.date.today().toordinal()))
@@ -0,0 +1,117 @@
+import threading
+from array import array
+from collections import OrderedDict
+import numpy as np
+
+SEARCH_FIELDS = ('word', 'meaning', 'sentence')
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def edit_distance(a, b, limit):
+    # Levenshtein，超過 limit 就提早放棄
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+class SearchIndex:
+    # 每個欄位一份 bigram 倒排索引 (gram -> 列位置)；查詢時從最短的 posting list 取候選再逐筆確認
+    def __init__(self, df_vocab, fields=SEARCH_FIELDS, cache_size=32, fuzzy_below=10, fuzzy_max_candidates=64):
+        self.fuzzy_below = fuzzy_below
+        self.fuzzy_max_candidates = fuzzy_max_candidates
+        self.texts = {}
+        self.postings = {}
+        for field in fields:
+            texts = [str(t).lower() for t in df_vocab[field].tolist()]
+            postings = {}
+            for pos, text in enumerate(texts):
+                for gram in _bigrams(text):
+                    postings.setdefault(gram, []).append(pos)
+            self.texts[field] = texts
+            self.postings[field] = {g: array('I', ids) for g, ids in postings.items()}
+        self.word_lengths = np.array([len(t) for t in self.texts['word']], dtype=np.int32)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _substring(self, field, q):
+        texts = self.texts[field]
+        if len(q) < 2:
+            return [i for i, t in enumerate(texts) if q in t]
+        postings = self.postings[field]
+        lists = [postings.get(g) for g in _bigrams(q)]
+        if any(ids is None for ids in lists):
+            return []
+        return [i for i in min(lists, key=len) if q in texts[i]]
+
+    def _fuzzy(self, q, max_dist):
+        # 每個編輯最多破壞 2 個 bigram，所以相似字至少共享 len(grams) - 2d 個。
+        # 共享數用 bincount 一次算完，只有共享最多的前 fuzzy_max_candidates 個才逐筆算編輯距離
+        # (短查詢在大家都有的 bigram 上會有上千個候選，逐筆算 Python 版 Levenshtein 太慢)
+        texts = self.texts['word']
+        postings = self.postings['word']
+        grams = _bigrams(q)
+        need = max(1, len(grams) - 2 * max_dist)
+        lists = [np.frombuffer(postings[g], dtype=np.uint32) for g in grams if g in postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(texts))
+        ok = (shared >= need) & (np.abs(self.word_lengths - len(q)) <= max_dist)
+        candidates = np.flatnonzero(ok)
+        if len(candidates) > self.fuzzy_max_candidates:
+            # 共享多的優先，同分取列位置小的 (結果固定)
+            order = np.lexsort((candidates, -shared[candidates]))
+            candidates = candidates[order[:self.fuzzy_max_candidates]]
+        hits = []
+        for pos in candidates.tolist():
+            d = edit_distance(q, texts[pos], max_dist)
+            if d <= max_dist:
+                hits.append((d, pos))
+        return hits
+
+    def _rank(self, q):
+        # 排序: 單字完全相同 > 單字開頭 > 單字包含 > 中文意思 > 例句 > 拼錯 (依編輯距離)
+        ranks = {}
+        def add(pos, rank):
+            if rank < ranks.get(pos, 99):
+                ranks[pos] = rank
+
+        words = self.texts['word']
+        for pos in self._substring('word', q):
+            w = words[pos]
+            add(pos, 0 if w == q else 1 if w.startswith(q) else 2)
+        if 'meaning' in self.texts:
+            for pos in self._substring('meaning', q):
+                add(pos, 3)
+        if 'sentence' in self.texts:
+            for pos in self._substring('sentence', q):
+                add(pos, 4)
+        # 找不太到東西時才補拼錯的候選
+        if len(q) >= 3 and len(ranks) < self.fuzzy_below:
+            for d, pos in self._fuzzy(q, 1 if len(q) <= 5 else 2):
+                add(pos, 4 + d)
+        return [pos for pos, _ in sorted(ranks.items(), key=lambda kv: (kv[1], kv[0]))]
+
+    def search(self, query):
+        q = str(query).strip().lower()
+        if not q:
+            return []
+        with self._lock:
+            hit = self._cache.get(q)
+            if hit is not None:
+                self._cache.move_to_end(q)
+                return hit
+        result = self._rank(q)
+        with self._lock:
+            self._cache[q] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,58 @@
+import datetime
+import pandas as pd
+import pytest
+from analytics import Analytics
+from progress import ReviewLog
+
+DAY = datetime.date(2024, 3, 10).toordinal()
+
+def make_log(tmp_path):
+    log = ReviewLog(str(tmp_path / 'events.bin'))
+    # (word, old, new, gap, day)
+    log.record('u1', [('apple', 1, 2, -1, DAY - 2), ('bear', 1, 1, -1, DAY - 2)])
+    log.record('u1', [('apple', 2, 3, 2, DAY - 1), ('bear', 1, 1, 1, DAY)])
+    log.record('u2', [('apple', 1, 1, -1, DAY)])
+    return log
+
+def make_analytics():
+    df = pd.DataFrame({'word': ['apple', 'bear'], 'meaning': ['蘋果', '熊'], 'week': ['1', '2'], 'type': ['n', 'n']})
+    return Analytics(df)
+
+def test_user_report(tmp_path):
+    report = make_analytics().report(make_log(tmp_path), 'u1', datetime.date.fromordinal(DAY))
+    assert report['reviews'] == 4
+    assert report['accuracy'] == 0.5
+    assert (report['active_days'], report['current_streak'], report['longest_streak']) == (3, 3, 3)
+    assert report['missed']['word'].tolist() == ['bear']
+    assert report['levels'].iloc[-1].tolist() == [1, 0, 1, 0]
+
+def test_class_report_and_incremental_update(tmp_path):
+    log = make_log(tmp_path)
+    analytics = make_analytics()
+    today = datetime.date.fromordinal(DAY)
+    report = analytics.report(log, None, today)
+    assert report['reviews'] == 5 and report['missed']['word'].tolist() == ['bear', 'apple']
+    assert analytics.report(log, None, today) is report  # 沒有新紀錄就用快取
+    log.record('u2', [('bear', 1, 2, -1, DAY)])
+    report = analytics.report(log, None, today)
+    assert report['reviews'] == 6 and report['accuracy'] == 3 / 6
+
+def test_followed_class_totals_update_on_write(tmp_path, monkeypatch):
+    log = make_log(tmp_path)
+    analytics = make_analytics()
+    analytics.follow(log)
+    analytics.follow(log)  # 重複呼叫不會重複訂閱
+    log.record('u2', [('bear', 1, 2, -1, DAY)])
+    # 寫入時就累加完了: 報表只畫圖，不再處理紀錄
+    monkeypatch.setattr(analytics, '_add', lambda *a: pytest.fail('report re-scanned the log'))
+    report = analytics.report(log, None, datetime.date.fromordinal(DAY))
+    assert report['reviews'] == 6 and report['accuracy'] == 3 / 6
+
+def test_dropped_analytics_unsubscribes(tmp_path):
+    log = make_log(tmp_path)
+    make_analytics().follow(log)
+    log.record('u1', [('apple', 3, 4, 0, DAY)])
+    assert log._listeners == []
+
+def test_unknown_user_has_no_reviews(tmp_path):
+    assert make_analytics().report(make_log(tmp_path), 'nobody')['reviews'] == 0
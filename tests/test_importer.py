@@ -0,0 +1,66 @@
+import os
+import time
+import pandas as pd
+import pytest
+import importer
+
+COLS = ['word', 'meaning', 'phonetic', 'sentence', 'sentence_cn', 'type', 'week']
+
+def write_csv(path, words, meaning='m'):
+    pd.DataFrame({c: words if c == 'word' else [meaning] * len(words) for c in COLS}).to_csv(path, index=False)
+    os.utime(path, ns=(time.time_ns(), time.time_ns()))
+
+def compiled_words():
+    return pd.read_parquet('toeic_vocab.parquet')['word'].tolist()
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def test_compile_dedups_across_sources_first_wins(workdir):
+    write_csv('a.csv', ['a1', 'dup'], meaning='from a')
+    write_csv('b.csv', ['dup', 'b1', 'b1'], meaning='from b')
+    result = importer.compile_sources(['a.csv', 'b.csv'])
+    assert result['words'] == 3 and result['cross_duplicates'] == 1
+    assert result['sources'][1]['duplicates'] == 1
+    df = pd.read_parquet('toeic_vocab.parquet')
+    assert df['word'].tolist() == ['a1', 'dup', 'b1']
+    assert df.set_index('word').loc['dup', 'meaning'] == 'from a'
+
+def test_compile_is_incremental(workdir):
+    write_csv('a.csv', ['a1'])
+    write_csv('b.csv', ['b1'])
+    importer.compile_sources(['a.csv', 'b.csv'])
+    again = importer.compile_sources(['a.csv', 'b.csv'])
+    assert again['imported'] == [] and not again['rebuilt']
+    write_csv('b.csv', ['b1', 'b2'])
+    changed = importer.compile_sources(['a.csv', 'b.csv'])
+    assert changed['imported'] == [os.path.abspath('b.csv')] and changed['rebuilt']
+    assert compiled_words() == ['a1', 'b1', 'b2']
+
+def test_refresh_compiled_picks_up_edited_source(workdir):
+    write_csv('a.csv', ['a1'])
+    importer.compile_sources(['a.csv'])
+    assert importer.refresh_compiled() is None
+    write_csv('a.csv', ['a1', 'a2'])
+    assert importer.refresh_compiled()['imported'] == [os.path.abspath('a.csv')]
+    assert compiled_words() == ['a1', 'a2']
+
+def test_refresh_keeps_words_of_moved_source(workdir):
+    write_csv('a.csv', ['a1'])
+    write_csv('b.csv', ['b1'])
+    importer.compile_sources(['a.csv', 'b.csv'])
+    os.rename('a.csv', 'a_old.csv')
+    write_csv('b.csv', ['b1', 'b2'])
+    result = importer.refresh_compiled()
+    assert result['imported'] == [os.path.abspath('b.csv')]
+    assert compiled_words() == ['a1', 'b1', 'b2']
+    # 之後再 refresh 也不會把搬走的來源丟掉
+    assert importer.refresh_compiled() is None
+    assert [e['path'] for e in importer._read_manifest()['sources']] == [os.path.abspath('a.csv'), os.path.abspath('b.csv')]
+
+def test_source_without_word_column_is_rejected(workdir):
+    pd.DataFrame({'meaning': ['x']}).to_csv('bad.csv', index=False)
+    with pytest.raises(ValueError):
+        importer.compile_sources(['bad.csv'])
@@ -0,0 +1,92 @@
+import os
+import time
+import progress
+from progress import ProgressDB, ProgressJournal, ReviewLog, SheetsSync
+
+class FakeWorksheet:
+    # gspread Worksheet 的替身: 只有 append_rows
+    def __init__(self):
+        self.batches = []
+
+    def append_rows(self, rows):
+        self.batches.append(rows)
+
+    def rows(self):
+        return [r for batch in self.batches for r in batch]
+
+def test_sheets_sync_sends_each_row_once(tmp_path):
+    db = ProgressDB(str(tmp_path / 'p.db'), flush_interval=3600)
+    sheet = FakeWorksheet()
+    sync = SheetsSync(db, sheet)
+    db.record_many('u1', [('apple', 2, '2024-01-01'), ('bear', 3, '2024-01-01')])
+    db.record('u2', 'apple', 1, '2024-01-02')
+    assert sync.sync_once() == 3
+    assert sync.sync_once() == 0
+    db.record('u1', 'apple', 3, '2024-01-03')
+    assert sync.sync_once() == 1
+    assert [r[:3] for r in sheet.rows()][-1] == ['u1', 'apple', 3]
+    assert len(sheet.batches) == 2
+    db.close()
+
+def test_sheets_sync_keeps_rows_queued_before_a_sync(tmp_path):
+    # 兩個行程共用同一個 DB: 先排進 a 的列比 b 晚寫入，也不能落在同步水位後面
+    path = str(tmp_path / 'p.db')
+    a, b = ProgressDB(path, flush_interval=3600), ProgressDB(path, flush_interval=3600)
+    sheet = FakeWorksheet()
+    sync = SheetsSync(b, sheet)
+    a.record('u1', 'early', 2, '2024-01-01')
+    time.sleep(0.01)
+    b.record('u2', 'late', 2, '2024-01-01')
+    assert sync.sync_once() == 1
+    a.flush()
+    assert sync.sync_once() == 1
+    assert sorted(r[1] for r in sheet.rows()) == ['early', 'late']
+    a.close()
+    b.close()
+
+def test_journal_compaction_keeps_latest_level(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'p.csv'), str(tmp_path / 'p.journal'))
+    journal.record('apple', 2, '2024-01-01')
+    journal.record_many([('bear', 3, '2024-01-01'), ('apple', 4, '2024-01-02')])
+    journal.compact()
+    assert os.path.getsize(tmp_path / 'p.journal') == 0
+    journal.record('bear', 1, '2024-01-03')
+    df = journal.load().set_index('word')
+    assert df.loc['apple', 'level'] == 4 and df.loc['apple', 'last_review_date'] == '2024-01-02'
+    assert df.loc['bear', 'level'] == 1
+    journal.close()
+
+def test_journal_counts_bytes_written(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'p.csv'), str(tmp_path / 'p.journal'))
+    journal.record_many([('蘋果', 2, '2024-01-01'), ('bear', 3, '2024-01-01')])
+    appended = os.path.getsize(tmp_path / 'p.journal')
+    assert journal.bytes_written == appended
+    journal.compact()
+    # 壓縮後 journal 清空，但計數還包含先前追加的部分
+    assert journal.bytes_written == appended + os.path.getsize(tmp_path / 'p.csv')
+    journal.close()
+
+def test_journal_fsyncs_idle_lines(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(progress.os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+    journal = ProgressJournal(str(tmp_path / 'p.csv'), str(tmp_path / 'p.journal'), fsync_interval=0.1)
+    journal.record('apple', 2, '2024-01-01')
+    journal.record('bear', 2, '2024-01-01')
+    deadline = time.monotonic() + 2
+    while journal._unsynced and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert journal._unsynced == 0 and synced
+    journal.close()
+
+def test_review_log_first_flag_across_writers(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    a, b = ReviewLog(path), ReviewLog(path)
+    a.record('u1', [('x', 1, 2, -1, 1), ('y', 1, 2, -1, 1), ('x', 2, 3, 0, 1)])
+    b.record('u1', [('x', 3, 4, 0, 2), ('z', 1, 2, -1, 2)])
+    b.record('u2', [('x', 1, 2, -1, 2)])
+    a.record('u1', [('z', 2, 3, 0, 3), ('w', 1, 1, -1, 3)])
+    events, words, users = ReviewLog(path).snapshot()
+    assert events['first'].tolist() == [True, True, False, False, True, True, False, True]
+    assert [words[i] for i in events['word']] == ['x', 'y', 'x', 'x', 'z', 'x', 'z', 'w']
+    assert set(users) == {'u1', 'u2'}
@@ -0,0 +1,26 @@
+import datetime
+from scheduler import DueQueue, days_since
+
+TODAY = datetime.date(2024, 3, 10)
+
+def test_due_queue_orders_overdue_then_new_then_later():
+    # 1: 今天複習過 level 4 (一週後到期)；3: 三天前 level 2 (前天到期)；其他沒看過 (今天到期，照範圍順序)
+    dates = ['', str(TODAY), '', str(TODAY - datetime.timedelta(days=3)), '']
+    queue = DueQueue([0, 1, 2, 3, 4], [1, 4, 1, 2, 1], dates, today=TODAY)
+    assert len(queue) == 5
+    assert [queue.pop() for _ in range(6)] == [3, 0, 2, 4, 1, None]
+
+def test_due_queue_requeue_and_schedule():
+    today = datetime.date.today()
+    queue = DueQueue([10, 20, 30], [1, 1, 1], ['', '', ''], today=today)
+    first = queue.pop()
+    queue.requeue(first)  # 跳過: 排到今天最後面
+    assert [queue.pop(), queue.pop(), queue.pop()] == [20, 30, first]
+    queue.schedule(20, 4, str(today))
+    queue.schedule(99, 4, str(today))  # 不在範圍裡的字不排
+    assert queue.pop() == 20 and queue.pop() is None
+
+def test_days_since():
+    assert days_since('', TODAY) == -1
+    assert days_since('not a date', TODAY) == -1
+    assert days_since('2024-03-07', TODAY) == 3
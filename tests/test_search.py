@@ -0,0 +1,37 @@
+import pandas as pd
+from search import SearchIndex, edit_distance
+
+def make_index(**kwargs):
+    df = pd.DataFrame({
+        'word': ['account', 'accountant', 'count', 'discount', 'mount', 'ledger'],
+        'meaning': ['帳戶', '會計師', '數', '折扣', '山', '帳簿'],
+        'sentence': ['', '', '', '', '', 'Keep the account in the ledger.'],
+    })
+    return df, SearchIndex(df, **kwargs)
+
+def words(df, positions):
+    return [df['word'][p] for p in positions]
+
+def test_rank_exact_prefix_contains_then_other_fields():
+    df, index = make_index()
+    # 完全相同 > 開頭 > 例句；結果不到 fuzzy_below 筆時補上拼錯的候選 (count 差 2 個字)
+    assert words(df, index.search('account')) == ['account', 'accountant', 'ledger', 'count']
+    assert words(df, index.search('count'))[:1] == ['count']
+    assert words(df, index.search('帳')) == ['account', 'ledger']
+
+def test_fuzzy_finds_typos_by_edit_distance():
+    df, index = make_index()
+    assert words(df, index.search('acount')) == ['account', 'count', 'mount']
+
+def test_fuzzy_candidate_cap_keeps_best_matches():
+    df, index = make_index(fuzzy_max_candidates=1)
+    assert words(df, index.search('acount')) == ['account']
+
+def test_search_is_cached_and_case_insensitive():
+    df, index = make_index()
+    assert index.search(' LEDGER ') is index.search('ledger')
+    assert index.search('') == []
+
+def test_edit_distance_limit():
+    assert edit_distance('kitten', 'sitting', 3) == 3
+    assert edit_distance('kitten', 'sitting', 1) == 2
@@ -0,0 +1,31 @@
+import os
+import tts
+from audiopack import AudioPack, build_pack
+
+def fake_wav(text, lang):
+    return b'RIFF' + text.encode('utf-8')
+fake_wav.ext = 'wav'
+
+def fake_mp3(text, lang):
+    return b'ID3' + text.encode('utf-8')
+fake_mp3.ext = 'mp3'
+
+def test_wav_pack_served_as_wav_under_mp3_backend(tmp_path, monkeypatch):
+    monkeypatch.setitem(tts.BACKENDS, 'espeak', fake_wav)
+    pack_file = str(tmp_path / 'audio.pack')
+    build_pack(['apple'], pack_file, 'espeak', workers=1)
+    cache = tts.AudioCache(str(tmp_path / 'audio'), backend=fake_mp3, pack=AudioPack(pack_file))
+    key = tts.audio_key('apple')
+    assert cache.metrics()['pack'] == 1 and cache.metrics()['pack_ext'] == 'wav'
+    assert cache.url_for(key).endswith(f"{key}.wav") and cache.mime_for(key) == 'audio/wav'
+    assert cache.get('apple') == b'RIFFapple'
+    # URL 模式: 解出來的檔名跟網址一樣是 .wav
+    assert not cache.has_file('apple')
+    cache.ensure('apple')
+    assert cache.has_file('apple') and os.path.exists(tmp_path / 'audio' / f"{key}.wav")
+    assert cache.stats['synth'] == 0 and cache.stats['pack_hits'] == 2
+    # 包裡沒有的照引擎合成 mp3
+    other = tts.audio_key('bear')
+    assert cache.url_for(other).endswith('.mp3') and cache.mime_for(other) == 'audio/mpeg'
+    cache.prewarm(['apple', 'bear'], to_disk=True, workers=1)
+    assert os.path.exists(tmp_path / 'audio' / f"{other}.mp3") and cache.stats['synth'] == 1
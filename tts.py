@@ -0,0 +1,317 @@
+import argparse
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from audiopack import AUDIO_PACK_FILE, AudioPack
+from metrics import incr, timed
+
+# 放在 app.py 旁的 static/ 下，開啟 enableStaticServing 時可直接用網址取檔
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "audio")
+AUDIO_URL = "./app/static/audio"
+AUDIO_MIME = {'mp3': 'audio/mpeg', 'wav': 'audio/wav'}
+
+# 合成引擎: fn(text, lang) -> 音檔 bytes，fn.ext 是輸出格式。TOEIC_TTS_BACKEND 選用哪一個
+@timed('tts.synth')
+def gtts_backend(text, lang):
+    from gtts import gTTS
+    audio_bytes = BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(audio_bytes)
+    return audio_bytes.getvalue()
+gtts_backend.ext = 'mp3'
+
+@timed('tts.synth')
+def espeak_backend(text, lang):
+    # 離線: 呼叫系統的 espeak-ng (apt install espeak-ng)，文字從 stdin 給
+    try:
+        out = subprocess.run(['espeak-ng', '-v', lang, '--stdout'], input=text.encode('utf-8'),
+                             capture_output=True, timeout=30)
+    except FileNotFoundError:
+        raise RuntimeError("找不到 espeak-ng，請先安裝或改用 TOEIC_TTS_BACKEND=gtts") from None
+    if out.returncode != 0 or not out.stdout:
+        raise RuntimeError(f"espeak-ng 失敗 ({out.returncode}): {out.stderr.decode('utf-8', 'replace').strip()}")
+    return out.stdout
+espeak_backend.ext = 'wav'
+
+BACKENDS = {'gtts': gtts_backend, 'espeak': espeak_backend}
+TTS_BACKEND = os.environ.get("TOEIC_TTS_BACKEND", "gtts")
+
+def get_backend(name=None):
+    name = name or TTS_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的語音引擎: {name} (可用: {', '.join(BACKENDS)})")
+    return name, BACKENDS[name]
+
+def audio_key(text, lang='en'):
+    return hashlib.sha1(f"{lang}\0{text}".encode('utf-8')).hexdigest()
+
+class AudioCache:
+    # 以 hash(文字+語言) 存音檔: 記憶體 LRU -> 語音包 -> 磁碟 -> 真的合成
+    def __init__(self, audio_dir=AUDIO_DIR, backend=gtts_backend,
+                 max_memory_bytes=32 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024, pack=None):
+        self.audio_dir = audio_dir
+        self.backend = backend
+        self.ext = getattr(backend, 'ext', 'mp3')
+        self.mime = AUDIO_MIME.get(self.ext, 'audio/mpeg')
+        self.pack = None
+        self.pack_key = None
+        if pack is not None:
+            self.use_pack(pack)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = None
+        self._disk_bytes = 0
+        self.stats = {'memory_hits': 0, 'pack_hits': 0, 'disk_hits': 0, 'synth': 0, 'failed': 0}
+        self.last_error = None
+        self._warmed = set()
+
+    def use_pack(self, pack, pack_key=None):
+        # 包的格式可以跟目前引擎不同 (例如 gtts 下用 espeak 的 wav 包)，包裡的音檔照包的格式送出
+        self.pack, self.pack_key = pack, pack_key
+
+    def ext_for(self, key):
+        pack = self.pack
+        return pack.ext if pack is not None and key in pack else self.ext
+
+    def mime_for(self, key):
+        return AUDIO_MIME.get(self.ext_for(key), 'audio/mpeg')
+
+    def url_for(self, key):
+        return f"{AUDIO_URL}/{key}.{self.ext_for(key)}"
+
+    def path_for(self, key, ext=None):
+        return os.path.join(self.audio_dir, f"{key}.{ext or self.ext}")
+
+    def _synth(self, text, lang):
+        # 合成失敗不吞掉: 記數 + 最後一個錯誤，側邊欄會顯示，再往上丟
+        try:
+            data = self.backend(text, lang)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+                self.last_error = repr(e)
+            incr('tts.failed')
+            raise
+        with self._lock:
+            self.stats['synth'] += 1
+        incr('tts.synth')
+        return data
+
+    def _from_pack(self, key):
+        pack = self.pack
+        data = pack.get(key) if pack is not None else None
+        if data is not None:
+            with self._lock:
+                self.stats['pack_hits'] += 1
+            incr('tts.pack_hit')
+        return data
+
+    def _scan_disk(self):
+        # 第一次用到時掃一次目錄，之後增量維護 (依 mtime 由舊到新)；以檔名 (key.副檔名) 記，包解出來的 wav 也算
+        if self._disk is not None:
+            return
+        os.makedirs(self.audio_dir, exist_ok=True)
+        entries = []
+        for f in os.listdir(self.audio_dir):
+            if f.rpartition('.')[2] in AUDIO_MIME:
+                st_ = os.stat(os.path.join(self.audio_dir, f))
+                entries.append((st_.st_mtime, f, st_.st_size))
+        self._disk = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+
+    def _remember(self, key, data):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    def _store(self, key, data, ext=None):
+        name = f"{key}.{ext or self.ext}"
+        path = os.path.join(self.audio_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(name, 0)
+            self._disk[name] = len(data)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_name, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                try:
+                    os.remove(os.path.join(self.audio_dir, old_name))
+                except OSError:
+                    pass
+
+    def contains(self, text, lang='en'):
+        key = audio_key(text, lang)
+        with self._lock:
+            self._scan_disk()
+            if key in self._memory or f"{key}.{self.ext}" in self._disk:
+                return True
+        return self.pack is not None and key in self.pack
+
+    def has_file(self, text, lang='en'):
+        # URL 模式: 網址指到的檔案 (照 ext_for 的副檔名) 已經在磁碟上
+        key = audio_key(text, lang)
+        name = f"{key}.{self.ext_for(key)}"
+        with self._lock:
+            self._scan_disk()
+            return name in self._disk
+
+    def get(self, text, lang='en'):
+        key = audio_key(text, lang)
+        with self._lock:
+            self._scan_disk()
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                incr('tts.memory_hit')
+                return data
+            name = f"{key}.{self.ext}"
+            on_disk = name in self._disk
+            if on_disk:
+                self._disk.move_to_end(name)
+
+        data = self._from_pack(key)
+        if data is not None:
+            return data
+        if on_disk:
+            try:
+                with open(self.path_for(key), 'rb') as fh:
+                    data = fh.read()
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                    self._remember(key, data)
+                incr('tts.disk_hit')
+                return data
+            except OSError:
+                pass
+
+        data = self._synth(text, lang)
+        with self._lock:
+            self._remember(key, data)
+        self._store(key, data)
+        return data
+
+    def ensure(self, text, lang='en'):
+        # 只保證檔案在磁碟上 (給 URL 模式用)，不把音檔讀進記憶體；檔名的副檔名跟 url_for 一致
+        key = audio_key(text, lang)
+        ext = self.ext_for(key)
+        name = f"{key}.{ext}"
+        with self._lock:
+            self._scan_disk()
+            if name in self._disk:
+                self._disk.move_to_end(name)
+                self.stats['disk_hits'] += 1
+                incr('tts.disk_hit')
+                return key
+            data = self._memory.get(key) if ext == self.ext else None
+        if data is None:
+            data = self._from_pack(key)  # 從包裡複製出來就好，不用合成
+            if data is None:
+                ext = self.ext  # 包剛好被換掉: 改用引擎合成
+        if data is None:
+            data = self._synth(text, lang)
+        self._store(key, data, ext)
+        return key
+
+    def prewarm(self, texts, lang='en', workers=8, to_disk=False):
+        # 先把整批文字合成好放進快取，已經有的直接跳過；to_disk: URL 模式要的是磁碟上的檔案 (包裡的也要解出來)
+        fn, have = (self.ensure, self.has_file) if to_disk else (self.get, self.contains)
+        todo = []
+        for t in dict.fromkeys(str(t).strip() for t in texts):
+            if t and t != 'nan' and not have(t, lang):
+                todo.append(t)
+        failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for fut in [pool.submit(fn, t, lang) for t in todo]:
+                try:
+                    fut.result()
+                except Exception:
+                    failed += 1
+        return {'requested': len(todo), 'failed': failed}
+
+    def prewarm_once(self, name, texts, jobs):
+        # 同一批文字 (例如回饋語音) 每個快取只在背景排一次，之後的 session / rerun 直接略過
+        with self._lock:
+            if name in self._warmed:
+                return
+            self._warmed.add(name)
+        jobs.submit(self.prewarm, texts)
+
+    def metrics(self):
+        with self._lock:
+            return {**self.stats, 'pack': len(self.pack) if self.pack is not None else 0,
+                    'pack_ext': self.pack.ext if self.pack is not None else None,
+                    'last_error': self.last_error}
+
+# 同一個行程內所有 session 共用
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _pack_key(path):
+    try:
+        st_ = os.stat(path)
+    except OSError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size)
+
+def get_audio_cache(audio_dir=AUDIO_DIR, pack_file=AUDIO_PACK_FILE):
+    # 語音包重建 (mtime / 大小變了) 就換新的，跟單字表一樣不用重開 App
+    key = os.path.abspath(audio_dir)
+    pack_key = _pack_key(pack_file)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = AudioCache(audio_dir, get_backend()[1])
+        if cache.pack_key != pack_key:
+            try:
+                cache.use_pack(AudioPack(pack_file) if pack_key else None, pack_key)
+            except (OSError, ValueError):
+                incr('tts.pack_error')
+                cache.use_pack(None, pack_key)
+        return cache
+
+def install_audio_cache(cache, audio_dir=AUDIO_DIR):
+    # 效能量測 / 離線測試用: 換掉這個目錄對應的快取 (例如接本機假的合成器)
+    with _caches_lock:
+        _caches[os.path.abspath(audio_dir)] = cache
+
+FEEDBACK_LINES = [
+    "That is correct! Great job!", "Sorry, that is incorrect.",
+    "That is correct!", "Sorry, incorrect.",
+    "That is correct! Attack!", "Wrong! You take damage.",
+]
+
+def prewarm_pool(df_pool, cache=None, workers=8):
+    texts = FEEDBACK_LINES + df_pool['word'].tolist() + df_pool['sentence'].tolist()
+    return (cache or get_audio_cache()).prewarm(texts, workers=workers)
+
+if __name__ == "__main__":
+    # 例: python tts.py --week 3 --type "Commerce 貿易"
+    from vocab import data_source, load_vocab
+    from views import FilterView
+    parser = argparse.ArgumentParser(description="預先合成指定週次/分類的單字與例句語音")
+    parser.add_argument('--data', default=data_source())
+    parser.add_argument('--week')
+    parser.add_argument('--type')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    # 跟 App 側邊欄用同一套篩選: week 是 Int16 (或文字)，都換成整數代碼比對
+    df_vocab = load_vocab(args.data)
+    df_pool = df_vocab.iloc[FilterView(df_vocab).positions(args.type, int(float(args.week)) if args.week else None)]
+    result = prewarm_pool(df_pool, workers=args.workers)
+    print(f"{len(df_pool)} 個單字，新合成 {result['requested']} 段語音，失敗 {result['failed']} 段")
@@ -0,0 +1,141 @@
+import re
+
+# 畫面用的 CSS / HTML 樣板: 模組只載入一次，壓縮好的字串之後每次 rerun 直接用，不用重新組
+
+TABS = ["🔥 閃卡特訓", "⚔️ 挑戰擂台", "🎧 聽音拼字", "👹 勇者鬥惡龍", "📊 單字總表", "⚡ 快速回合", "📈 學習分析"]
+
+_CSS = """
+    /* 全站背景 */
+    .stApp { background-color: #f4f6f9; }
+
+    /* --- 1. 側邊欄 (維持原樣) --- */
+    [data-testid="stSidebar"] { background-color: #2c3e50; }
+    [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3 { color: #f1c40f !important; }
+    [data-testid="stSidebar"] p, [data-testid="stSidebar"] span, [data-testid="stSidebar"] label, [data-testid="stSidebar"] div { color: #ecf0f1 !important; font-size: 16px; }
+
+    /* --- 2. 主畫面標題修復 (解決看不清楚的問題) --- */
+    /* 強制將主畫面的標題設為深藍色，對比度最高 */
+    .main h1, .main h2, .main h3, .main h4 {
+        color: #2c3e50 !important;
+        font-weight: 800 !important;
+    }
+
+    /* --- 3. caption 小字修復 (解決進度文字看不清楚) --- */
+    /* 針對 st.caption 產生的文字 */
+    .stCaption, [data-testid="stCaptionContainer"] {
+        color: #5d6d7e !important; /* 深灰色 */
+        font-size: 16px !important;
+        font-weight: bold !important;
+    }
+
+    /* --- 4. 分頁選單 (st.radio 做成標籤頁的樣子，只跑選到的那頁) --- */
+    .st-key-active_tab [role="radiogroup"] { gap: 8px; flex-wrap: wrap; padding-bottom: 10px; }
+    .st-key-active_tab [role="radiogroup"] label { height: 55px; background-color: #e0e0e0; border-radius: 8px; border: 1px solid #ccc; padding: 0 25px; margin: 0; align-items: center; }
+    .st-key-active_tab [role="radiogroup"] label > div:first-child { display: none; }
+    .st-key-active_tab [role="radiogroup"] label p { color: #333333 !important; font-weight: 700; font-size: 18px; }
+    .st-key-active_tab [role="radiogroup"] label:has(input:checked) { background-color: #f1c40f; border: none; transform: translateY(-2px); box-shadow: 0 4px 10px rgba(241, 196, 15, 0.4); }
+    .st-key-active_tab [role="radiogroup"] label:has(input:checked) p { color: #ffffff !important; }
+
+    /* --- 5. 卡片設計 --- */
+    .flashcard-container { background: white; border-radius: 20px; padding: 40px 30px; text-align: center; box-shadow: 0 10px 30px rgba(0,0,0,0.08); margin-bottom: 25px; border-left: 12px solid #f1c40f; min-height: 350px; display: flex; flex-direction: column; justify-content: center; align-items: center; }
+    .flashcard-back { background: #fdfefe; border-left: 12px solid #2ecc71; }
+
+    .battle-card { background-color: #ffffff; padding: 30px; border-radius: 15px; border: 2px solid #3498db; border-left: 15px solid #2980b9; box-shadow: 0 5px 15px rgba(0,0,0,0.1); text-align: center; margin-bottom: 20px; color: #2c3e50; }
+    .battle-word { font-size: 56px; font-weight: 900; color: #2c3e50; margin: 15px 0; }
+    .battle-label { font-size: 18px; color: #7f8c8d; font-weight: bold; text-transform: uppercase; }
+
+    .word-title { font-size: 64px; font-weight: 900; color: #2c3e50; margin-bottom: 5px; }
+    .phonetic-text { font-family: 'Lucida Sans Unicode', sans-serif; font-size: 24px; color: #95a5a6; margin-bottom: 20px; font-style: italic; }
+    .meaning-text { font-size: 40px; color: #c0392b; font-weight: bold; margin: 20px 0; }
+    .example-box { background-color: #ecf0f1; padding: 20px; border-radius: 12px; margin-top: 20px; text-align: left; width: 100%; border-left: 5px solid #3498db; }
+    .sent-en { font-size: 20px; color: #2c3e50; margin-bottom: 10px; font-weight: 500; line-height: 1.4; }
+    .sent-cn { font-size: 18px; color: #16a085; font-weight: bold; }
+    .tag-badge { background-color: #e1f5fe; color: #0288d1; padding: 5px 15px; border-radius: 15px; font-size: 14px; font-weight: bold; margin-bottom: 15px; display: inline-block; }
+
+    /* --- 6. RPG 遊戲區例外處理 --- */
+    /* 因為 RPG 背景是深色，所以這裡要強制把文字改回亮色，不然會被上面的規則變成深色而看不見 */
+    .rpg-container { background-color: #2c3e50; padding: 20px; border-radius: 15px; color: white !important; text-align: center; margin-bottom: 20px; border: 3px solid #f1c40f; }
+
+    .rpg-container h3, .rpg-container h4, .rpg-container p {
+        color: #ffffff !important; /* 強制白色 */
+    }
+    /* 特別指定魔王名稱為金色 */
+    .rpg-container h3 {
+        color: #f1c40f !important;
+    }
+
+    .monster-img { font-size: 100px; margin-bottom: 10px; animation: bounce 2s infinite; }
+    .health-bar-container { width: 100%; background-color: #555; border-radius: 10px; margin: 10px 0; height: 25px; }
+    .health-bar-fill { height: 100%; border-radius: 10px; transition: width 0.5s ease-in-out; }
+
+    @keyframes bounce { 0%, 100% { transform: translateY(0); } 50% { transform: translateY(-10px); } }
+    audio { display: none; }
+"""
+
+def _minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};:,>])\s*', r'\1', css).strip()
+
+def _compact(html):
+    # 標籤之間的換行縮排拿掉: 送出去的字串比較小，也不會被 markdown 當成程式碼區塊
+    return re.sub(r'>\s+<', '><', html.strip())
+
+STYLE = f"<style>{_minify_css(_CSS)}</style>"
+
+FLASHCARD_FRONT = _compact("""
+    <div class="flashcard-container">
+        <div class="tag-badge">{type}</div>
+        <div class="word-title">{word}</div>
+        <div class="phonetic-text">{phonetic}</div>
+        <div style="color:#bdc3c7; margin-top:20px;">(點擊翻卡查看詳解)</div>
+    </div>
+""")
+
+FLASHCARD_BACK = _compact("""
+    <div class="flashcard-container flashcard-back">
+        <div class="word-title" style="font-size: 40px; color:#7f8c8d;">{word}</div>
+        <div class="phonetic-text">{phonetic}</div>
+        <hr style="width: 50%; border:1px solid #eee;">
+        <div class="meaning-text">{meaning}</div>
+        <div class="example-box">
+            <div class="sent-en">🇬🇧 {sentence}</div>
+            <div class="sent-cn">🇹🇼 {sentence_cn}</div>
+        </div>
+    </div>
+""")
+
+QUIZ_CARD = _compact("""
+    <div class="battle-card">
+        <div class="battle-label">Question</div>
+        <div class="battle-word">{word}</div>
+    </div>
+""")
+
+RPG_CARD = _compact("""
+    <div class="battle-card" style="border-color: #e74c3c;">
+        <div class="battle-label" style="color:#e74c3c;">⚔️ 攻擊指令 (Attack Command)</div>
+        <div class="battle-word">{word}</div>
+    </div>
+""")
+
+RPG_STATUS = _compact("""
+    <div class="rpg-container">
+        <div class="monster-img">{monster}</div>
+        <h3>多益大魔王 (TOEIC Boss)</h3>
+        <div class="health-bar-container">
+            <div class="health-bar-fill" style="width: {m_hp}%; background-color: #e74c3c;"></div>
+        </div>
+        <p>HP: {m_hp}/100</p>
+    </div>
+    <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:20px;">
+        <div style="width:45%; text-align:center; padding:10px; background: #34495e; border-radius:10px; color:white;">
+            <h4>🛡️ 勇者 (You)</h4>
+            <div class="health-bar-container">
+                <div class="health-bar-fill" style="width: {p_hp}%; background-color: #2ecc71;"></div>
+            </div>
+            <p>HP: {p_hp}/100</p>
+        </div>
+        <div style="font-size:30px;">VS</div>
+    </div>
+""")
@@ -0,0 +1,51 @@
+import threading
+import numpy as np
+import pandas as pd
+
+class FilterView:
+    # 每版單字表建一次: type / week 轉成整數代碼，各 (分類, 週次) 組合的列位置用到才算並記住
+    def __init__(self, df_vocab):
+        type_cat = pd.Categorical(df_vocab['type'])
+        self._type_codes = np.asarray(type_cat.codes)
+        self._type_lookup = {t: i for i, t in enumerate(type_cat.categories)}
+        weeks = pd.to_numeric(df_vocab['week'], errors='coerce')
+        self._week_codes = weeks.fillna(-1).astype(int).to_numpy()
+
+        self.types = sorted(t for t in type_cat.categories if t)
+        self.weeks = sorted(set(self._week_codes[self._week_codes >= 0].tolist()))
+        self.size = len(df_vocab)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def positions(self, type_=None, week=None):
+        # None 代表不篩選；回傳的陣列是共用的，呼叫端不要改它
+        key = (type_, week)
+        cached = self._positions.get(key)
+        if cached is not None:
+            return cached
+        mask = np.ones(self.size, dtype=bool)
+        if type_ is not None:
+            mask &= self._type_codes == self._type_lookup.get(type_, -2)
+        if week is not None:
+            mask &= self._week_codes == int(week)
+        pos = np.flatnonzero(mask)
+        pos.setflags(write=False)
+        with self._lock:
+            self._positions[key] = pos
+        return pos
+
+class ProgressStats:
+    # 側邊欄的已精通 / 今日字數: 開 session 時算一次，之後每次作答只加減差值
+    def __init__(self, progress, today_str):
+        self.today_str = today_str
+        self.mastered = sum(1 for lvl in progress.levels.values() if lvl >= 4)
+        self.today = sum(1 for d in progress.dates.values() if d == today_str)
+
+    def apply(self, old_level, new_level, old_date, new_date):
+        self.mastered += int(new_level >= 4) - int(old_level >= 4)
+        self.today += int(new_date == self.today_str) - int(old_date == self.today_str)
+
+    def apply_many(self, old_levels, new_levels, old_dates, new_date):
+        # 回合模式: 一整批的差值一次加上去
+        self.mastered += int((np.asarray(new_levels) >= 4).sum() - (np.asarray(old_levels) >= 4).sum())
+        self.today += len(old_dates) * int(new_date == self.today_str) - sum(1 for d in old_dates if d == self.today_str)
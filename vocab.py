@@ -0,0 +1,121 @@
+import os
+import pandas as pd
+from metrics import incr, span
+
+DATA_FILE = "toeic_db.xlsx"
+COMPILED_FILE = "toeic_vocab.parquet"  # importer.py 產生，存在時 App 直接開它
+CACHE_DIR = ".toeic_cache"
+EXPECTED_COLS = ['word', 'meaning', 'phonetic', 'sentence', 'sentence_cn', 'type', 'week']
+
+# 行程內快取: 絕對路徑 -> (檔案指紋, 單字表, 衍生結構 dict)
+_vocab_cache = {}
+
+def file_key(path):
+    # 以 路徑 + mtime + 大小 當作快取鍵，檔案一改就失效
+    st_ = os.stat(path)
+    return (os.path.abspath(path), st_.st_mtime_ns, st_.st_size)
+
+def data_source():
+    return COMPILED_FILE if os.path.exists(COMPILED_FILE) else DATA_FILE
+
+def normalize_vocab(df_vocab):
+    df_vocab.columns = [str(c).strip().lower() for c in df_vocab.columns]
+
+    for col in EXPECTED_COLS:
+        if col not in df_vocab.columns:
+            df_vocab[col] = ''
+
+    for col in df_vocab.columns:
+        df_vocab[col] = df_vocab[col].astype(str).replace('nan', '')
+
+    df_vocab.drop_duplicates(subset=['word'], inplace=True)
+    return df_vocab.reset_index(drop=True)
+
+def compact_vocab(df_vocab):
+    # 全行程共用一份唯讀單字表: 字串放 Arrow、type 用 category、整數週次用 Int16
+    for col in df_vocab.columns:
+        dtype = df_vocab[col].dtype
+        if isinstance(dtype, (pd.CategoricalDtype, pd.Int16Dtype)):
+            continue
+        text = df_vocab[col].astype(str)
+        if col == 'type':
+            df_vocab[col] = text.astype('category')
+            continue
+        if col == 'week':
+            weeks = pd.to_numeric(text.where(text != ''), errors='coerce')
+            given = weeks.notna().sum() == (text != '').sum()
+            if given and (weeks.dropna() % 1 == 0).all() and (weeks.dropna().abs() < 2 ** 15).all():
+                df_vocab[col] = weeks.astype('Int16')
+                continue
+        if not (isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow'):
+            df_vocab[col] = text.astype('string[pyarrow]')
+    return df_vocab
+
+def _snapshot_path(key):
+    path, mtime, size = key
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}_{mtime}_{size}.parquet")
+
+def _write_snapshot(df_vocab, snap_path):
+    # 先寫暫存檔再 rename，避免多個 session 同時寫出半個檔案
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        prefix = os.path.basename(snap_path).rsplit('_', 2)[0] + '_'
+        for f in os.listdir(CACHE_DIR):
+            if f.startswith(prefix) and f.endswith('.parquet'):
+                os.remove(os.path.join(CACHE_DIR, f))
+        tmp_path = f"{snap_path}.{os.getpid()}.tmp"
+        df_vocab.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, snap_path)
+    except Exception:
+        pass
+
+def build_word_index(df_vocab):
+    # word -> 列位置 (RangeIndex，所以位置即 label)，之後 .at 讀寫都是 O(1)
+    return {w: i for i, w in enumerate(df_vocab['word'].tolist())}
+
+def _load(path):
+    # 只在 Excel 有變動時才重新解析；冷啟動優先讀 parquet 快照
+    key = file_key(path)
+    cached = _vocab_cache.get(key[0])
+    if cached is not None and cached[0] == key:
+        incr('vocab.cache_hit')
+        return cached[1], cached[2]
+
+    if path.endswith('.parquet'):
+        # 匯入流程已經正規化、去重好了，直接讀
+        with span('vocab.read_compiled'):
+            df_vocab = compact_vocab(pd.read_parquet(path))
+        derived = {}
+        _vocab_cache[key[0]] = (key, df_vocab, derived)
+        return df_vocab, derived
+
+    df_vocab = None
+    snap_path = _snapshot_path(key)
+    if os.path.exists(snap_path):
+        try:
+            df_vocab = compact_vocab(pd.read_parquet(snap_path))
+        except Exception:
+            df_vocab = None
+
+    if df_vocab is None:
+        with span('vocab.parse_workbook'):
+            df_vocab = compact_vocab(normalize_vocab(pd.read_excel(path)))
+        _write_snapshot(df_vocab, snap_path)
+
+    derived = {}
+    _vocab_cache[key[0]] = (key, df_vocab, derived)
+    return df_vocab, derived
+
+def load_vocab(path=DATA_FILE):
+    return _load(path)[0]
+
+def load_derived(name, builder, path=DATA_FILE):
+    # 由單字表建出的索引等結構，跟著同一版單字表快取，Excel 一變就一起失效
+    df_vocab, derived = _load(path)
+    if name not in derived:
+        derived[name] = builder(df_vocab)
+    return derived[name]
+
+def load_word_index(path=DATA_FILE):
+    return load_derived('word_index', build_word_index, path)